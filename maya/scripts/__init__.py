@@ -4,6 +4,7 @@ import sys
 from .breakdownCommand import tdtInsertBreakdown as tdtInsertBreakdown
 from .curveCleanerCommand import tdtCleanCurves as tdtCleanCurves
 from .incrementalSaveCommand import tdtIncrementalSave as tdtIncrementalSave
+from .nudgeCommand import tdtNudgeTime as tdtNudgeTime
 from .retimingCommand import tdtRetiming as tdtRetiming
 from .setKeyCommand import tdtSetKeyframe as tdtSetKeyframe
 from .shotMaskCommand import tdtShotMask as tdtShotMask
@@ -0,0 +1,148 @@
+"""Index of the anim curves animating the attributes of nodes
+
+Curves are found by following the connections into each node's keyable, unlocked attributes to the
+anim curves directly connected to them. Pair blend and character set nodes sitting between the node
+and its curves are passed through, and anim layer blend nodes are followed back to the curves of
+every layer.
+
+Results are cached per node and invalidated through DG connection callbacks, so every command can
+share the same index through `get_index`.
+"""
+from typing import NamedTuple
+
+import maya.api.OpenMaya as om2
+
+
+class CurveConnection(NamedTuple):
+    """An anim curve animating an attribute"""
+
+    plug: om2.MPlug
+    curve: om2.MObjectHandle
+    curve_type: str
+    layered: bool
+
+
+def is_pass_through(node: om2.MObject) -> bool:
+    """Check if the node can sit between an animated attribute and its anim curves"""
+    return (
+        node.hasFn(om2.MFn.kPairBlend)
+        or node.hasFn(om2.MFn.kCharacter)
+        or node.hasFn(om2.MFn.kBlendNodeBase)
+    )
+
+
+class AnimCurveIndex:
+    def __init__(self):
+        self.connections = {}
+        self.callback_ids = []
+
+    def install_callbacks(self):
+        """Start listening for connection changes that invalidate the cached results"""
+        if not self.callback_ids:
+            self.callback_ids.append(om2.MDGMessage.addConnectionCallback(self._on_connection))
+
+    def remove_callbacks(self):
+        if self.callback_ids:
+            om2.MMessage.removeCallbacks(self.callback_ids)
+        self.callback_ids = []
+
+    def clear(self):
+        self.connections.clear()
+
+    def get_connections(self, node: om2.MObject) -> list[CurveConnection]:
+        """Get the anim curves connected to a node's attributes. Locked and non-keyable attributes
+        are filtered out when the cached connections are read, so lock changes don't need to
+        invalidate the cache.
+        """
+        key = om2.MObjectHandle(node).hashCode()
+        cached = self.connections.get(key)
+        if cached is None or not cached[0].isValid() or cached[0].object() != node:
+            cached = (om2.MObjectHandle(node), list(find_curve_connections(node)))
+            self.connections[key] = cached
+        return [c for c in cached[1] if c.plug.isKeyable and not c.plug.isLocked]
+
+    def get_curves(
+        self, nodes: list[om2.MObject], curve_types: list[str] = None, layered: bool = True
+    ) -> dict[str, list[om2.MObjectHandle]]:
+        """Get the anim curves for a list of nodes grouped by their node type. Curves are only
+        returned once even when they animate several nodes.
+        """
+        grouped = {}
+        visited = set()
+        for node in nodes:
+            for connection in self.get_connections(node):
+                if curve_types is not None and connection.curve_type not in curve_types:
+                    continue
+                if connection.layered and not layered:
+                    continue
+                key = connection.curve.hashCode()
+                if key in visited:
+                    continue
+                visited.add(key)
+                grouped.setdefault(connection.curve_type, []).append(connection.curve)
+        return grouped
+
+    def _on_connection(self, src_plug, dst_plug, made, client_data):
+        dst_node = dst_plug.node()
+        if is_pass_through(dst_node):
+            # The nodes animated through this one are not known without searching downstream
+            self.clear()
+        else:
+            self.connections.pop(om2.MObjectHandle(dst_node).hashCode(), None)
+
+
+def find_curve_connections(node: om2.MObject):
+    """Yield the anim curves connected into the attributes of a node"""
+    dependency_fn = om2.MFnDependencyNode(node)
+    for plug in dependency_fn.getConnections():
+        if not plug.isDestination:
+            continue
+        source = plug.source()
+        for curve, layered in find_upstream_curves(source, layered=False):
+            yield CurveConnection(
+                plug=plug,
+                curve=om2.MObjectHandle(curve),
+                curve_type=om2.MFnDependencyNode(curve).typeName,
+                layered=layered,
+            )
+
+
+def find_upstream_curves(source: om2.MPlug, layered: bool, visited: set = None):
+    """Yield the anim curves feeding a plug, along with whether they come through an anim layer"""
+    if visited is None:
+        visited = set()
+
+    node = source.node()
+    key = om2.MObjectHandle(node).hashCode()
+    if key in visited:
+        return
+    visited.add(key)
+
+    if node.hasFn(om2.MFn.kAnimCurve):
+        yield node, layered
+    elif node.hasFn(om2.MFn.kCharacter):
+        # Character sets pass each member attribute through a plug of their own
+        if source.isDestination:
+            yield from find_upstream_curves(source.source(), layered, visited)
+    elif node.hasFn(om2.MFn.kPairBlend) or node.hasFn(om2.MFn.kBlendNodeBase):
+        # Pair blends and anim layer blends serve a single attribute (or compound), so every
+        # input is followed
+        is_layer = layered or node.hasFn(om2.MFn.kBlendNodeBase)
+        for plug in om2.MFnDependencyNode(node).getConnections():
+            if plug.isDestination:
+                yield from find_upstream_curves(plug.source(), is_layer, visited)
+
+
+# The index created before this module was reloaded still has callbacks registered
+if globals().get('_index') is not None:
+    _index.remove_callbacks()
+_index = None
+
+
+def get_index() -> AnimCurveIndex:
+    """Get the anim curve index shared by all commands"""
+    global _index
+    if _index is None:
+        _index = AnimCurveIndex()
+        _index.install_callbacks()
+    return _index
@@ -0,0 +1,205 @@
+"""Table of the keyable attributes of nodes and what can be keyed on them
+
+Each node's table holds, for every keyable attribute, whether it is locked, whether it is driven by
+something other than an anim curve (a constraint, an expression, ...), whether it is animated on
+anim layers, whether it only holds distinct values (boolean and enum attributes) and the anim curve
+animating it. Commands then check attributes with array lookups instead of inspecting every plug
+each time they run.
+
+Tables are cached per node. An attribute changed callback on the node invalidates its table when
+an attribute is locked, made keyable, connected or disconnected. A DG connection callback
+invalidates every table when a pair blend or character set between nodes and their curves is
+rewired.
+"""
+from typing import NamedTuple, Optional
+
+import maya.api.OpenMaya as om2
+import numpy as np
+
+from . import animCurveIndex
+
+INVALIDATING_MESSAGES = (
+    om2.MNodeMessage.kConnectionMade
+    | om2.MNodeMessage.kConnectionBroken
+    | om2.MNodeMessage.kAttributeLocked
+    | om2.MNodeMessage.kAttributeUnlocked
+    | om2.MNodeMessage.kAttributeKeyable
+    | om2.MNodeMessage.kAttributeUnkeyable
+    | om2.MNodeMessage.kAttributeAdded
+    | om2.MNodeMessage.kAttributeRemoved
+    | om2.MNodeMessage.kAttributeArrayAdded
+    | om2.MNodeMessage.kAttributeArrayRemoved
+)
+
+
+class AttributeTable(NamedTuple):
+    """The keyable attributes of a node, one entry per attribute
+
+    `curves` holds the anim curve animating each attribute (`None` when it isn't animated). Curves
+    on anim layers are not included, the attributes they animate are `layered` (and `driven`, as
+    the layer blend drives them).
+    """
+
+    plugs: list[om2.MPlug]
+    names: np.ndarray
+    locked: np.ndarray
+    driven: np.ndarray
+    layered: np.ndarray
+    stepped: np.ndarray
+    curves: list[Optional[om2.MObjectHandle]]
+    curve_types: np.ndarray
+
+    @property
+    def has_curve(self) -> np.ndarray:
+        return self.curve_types != ''
+
+    def __len__(self):
+        return len(self.plugs)
+
+
+def build_table(node: om2.MObject) -> AttributeTable:
+    """Inspect the keyable attributes of a node"""
+    plugs = get_keyable_plugs(node)
+
+    connections = {}
+    layered = set()
+    for connection in animCurveIndex.find_curve_connections(node):
+        if connection.layered:
+            layered.add(connection.plug.name())
+        else:
+            connections.setdefault(connection.plug.name(), connection)
+
+    curves = []
+    curve_types = []
+    driven = []
+    for plug in plugs:
+        connection = connections.get(plug.name())
+        curves.append(None if connection is None else connection.curve)
+        curve_types.append('' if connection is None else connection.curve_type)
+        driven.append(connection is None and plug.isDestination)
+
+    return AttributeTable(
+        plugs=plugs,
+        names=np.array([p.partialName() for p in plugs], dtype=object),
+        locked=np.array([p.isLocked for p in plugs], dtype=bool),
+        driven=np.array(driven, dtype=bool),
+        layered=np.array([p.name() in layered for p in plugs], dtype=bool),
+        stepped=np.array([is_stepped(p) for p in plugs], dtype=bool),
+        curves=curves,
+        curve_types=np.array(curve_types, dtype=object),
+    )
+
+
+def get_keyable_plugs(node: om2.MObject) -> list[om2.MPlug]:
+    """Get the plugs of the keyable attributes of a node. Like `listAttr -keyable`, the children of
+    compound attributes and the existing elements of multi attributes are included.
+    """
+    dependency_fn = om2.MFnDependencyNode(node)
+    plugs = []
+    for i in range(dependency_fn.attributeCount()):
+        attribute = dependency_fn.attribute(i)
+        # Child attributes are reached through their parent's plug
+        if om2.MFnAttribute(attribute).parent.isNull():
+            add_keyable_plugs(om2.MPlug(node, attribute), plugs)
+    return plugs
+
+
+def add_keyable_plugs(plug: om2.MPlug, plugs: list[om2.MPlug]):
+    """Add a plug to `plugs` if it is keyable, then its elements and children"""
+    if plug.isArray:
+        for index in plug.getExistingArrayAttributeIndices():
+            add_keyable_plugs(plug.elementByLogicalIndex(index), plugs)
+        return
+    if plug.isKeyable:
+        plugs.append(plug)
+    if plug.isCompound:
+        for index in range(plug.numChildren()):
+            add_keyable_plugs(plug.child(index), plugs)
+
+
+def is_stepped(plug: om2.MPlug) -> bool:
+    """Check if an attribute only holds distinct values (boolean and enum attributes)"""
+    attribute = plug.attribute()
+    if attribute.hasFn(om2.MFn.kEnumAttribute):
+        return True
+    return (
+        attribute.hasFn(om2.MFn.kNumericAttribute)
+        and om2.MFnNumericAttribute(attribute).numericType() == om2.MFnNumericData.kBoolean
+    )
+
+
+class AttributeTableCache:
+    def __init__(self):
+        # Node hash code -> [node handle, table, attribute changed callback id]. The callback stays
+        # installed when the table is invalidated, the table is just built again when needed
+        self.tables = {}
+        self.callback_ids = []
+
+    def install_callbacks(self):
+        """Start listening for connection changes that invalidate every table"""
+        if not self.callback_ids:
+            self.callback_ids.append(om2.MDGMessage.addConnectionCallback(self._on_connection))
+
+    def remove_callbacks(self):
+        self.clear()
+        if self.callback_ids:
+            om2.MMessage.removeCallbacks(self.callback_ids)
+        self.callback_ids = []
+
+    def clear(self):
+        for _, _, callback_id in self.tables.values():
+            remove_callback(callback_id)
+        self.tables.clear()
+
+    def invalidate(self, node: om2.MObject):
+        entry = self.tables.get(om2.MObjectHandle(node).hashCode())
+        if entry is not None:
+            entry[1] = None
+
+    def get_table(self, node: om2.MObject) -> AttributeTable:
+        """Get the attribute table of a node, building it the first time"""
+        key = om2.MObjectHandle(node).hashCode()
+        entry = self.tables.get(key)
+        if entry is not None and (not entry[0].isValid() or entry[0].object() != node):
+            remove_callback(entry[2])
+            entry = None
+        if entry is None:
+            callback_id = om2.MNodeMessage.addAttributeChangedCallback(
+                node, self._on_attribute_changed
+            )
+            entry = self.tables[key] = [om2.MObjectHandle(node), None, callback_id]
+        if entry[1] is None:
+            entry[1] = build_table(node)
+        return entry[1]
+
+    def _on_attribute_changed(self, message, plug, other_plug, client_data):
+        if message & INVALIDATING_MESSAGES:
+            self.invalidate(plug.node())
+
+    def _on_connection(self, src_plug, dst_plug, made, client_data):
+        if animCurveIndex.is_pass_through(dst_plug.node()):
+            for entry in self.tables.values():
+                entry[1] = None
+
+
+def remove_callback(callback_id):
+    try:
+        om2.MMessage.removeCallback(callback_id)
+    except RuntimeError:
+        # The callback went with its node when the node was deleted
+        pass
+
+
+# The cache created before this module was reloaded still has callbacks registered
+if globals().get('_cache') is not None:
+    _cache.remove_callbacks()
+_cache = None
+
+
+def get_cache() -> AttributeTableCache:
+    """Get the attribute table cache shared by all commands"""
+    global _cache
+    if _cache is None:
+        _cache = AttributeTableCache()
+        _cache.install_callbacks()
+    return _cache
@@ -0,0 +1,260 @@
+"""Run tradigiTOOLS commands over many scene files without opening them in the Maya UI
+
+The driver hands each file to its own `mayapy` worker process, a few at a time:
+
+    mayapy -m scripts.batch spec.json shot010.ma shot020.mb --workers 4 --log batch.json
+
+The spec is a JSON list of the commands to run on every file, in order. Each command can give the
+nodes to select before it runs (all nodes with anim curves when not given) and its flags:
+
+    [
+        {"command": "tdtCleanCurves", "select": ["*:*_ctrl"], "flags": {"tol": 0.01}},
+        {"command": "tdtRetiming", "flags": {"sp": 2, "ti": [1001, 1100]}}
+    ]
+
+The result is saved next to each file with an incremented name, as `tdtIncrementalSave` does. The
+log is rewritten as each file finishes, with the outcome and timings of every file so far.
+
+Files are run through a `runner` (a callable taking a job and returning its result) on an
+executor. Both can be replaced, e.g. `run_job` on a single thread runs every file in the current
+Maya session.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import traceback
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+
+from maya import cmds
+
+from . import curveCleanerCommand, nudgeCommand, retimingCommand
+from .incrementalSaveCommand import save_incremented
+
+# The directory holding this package, which the workers need on their path
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_PREFIX = 'tdtBatchResult:'
+
+
+def run_batch(
+    files: list[str],
+    operations: list[dict],
+    log_path: Optional[str] = None,
+    workers: Optional[int] = None,
+    runner: Optional[Callable[[dict], dict]] = None,
+    executor: Optional[Executor] = None,
+) -> list[dict]:
+    """Run the operations on every file and return the result of each file in the order they
+    finished. The log at `log_path` is updated as each file finishes.
+    """
+    if runner is None:
+        runner = MayapyRunner()
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=workers or get_default_workers())
+
+    log = BatchLog(log_path, operations)
+    try:
+        jobs = [{'file': os.path.abspath(f), 'operations': operations} for f in files]
+        futures = {executor.submit(runner, job): job['file'] for job in jobs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception:
+                result = failed_result(futures[future], traceback.format_exc())
+            log.add(result)
+            print(
+                f'[{len(log.results)}/{len(files)}] {result["file"]}: {result["status"]} '
+                f'({result.get("seconds", 0):.1f}s)',
+                flush=True,
+            )
+    finally:
+        if own_executor:
+            executor.shutdown()
+        log.finish()
+    return log.results
+
+
+class MayapyRunner:
+    """Runs each job in a new `mayapy` process"""
+
+    def __init__(self, mayapy: Optional[str] = None, timeout: Optional[float] = None):
+        self.mayapy = mayapy or sys.executable
+        self.timeout = timeout
+
+    def __call__(self, job: dict) -> dict:
+        start = time.perf_counter()
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            p for p in (PACKAGE_ROOT, env.get('PYTHONPATH')) if p
+        )
+        try:
+            process = subprocess.run(
+                [self.mayapy, '-m', f'{__package__}.batch', '--worker'],
+                input=json.dumps(job),
+                capture_output=True,
+                text=True,
+                env=env,
+                timeout=self.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return failed_result(job['file'], 'Timed out', time.perf_counter() - start)
+
+        # Maya prints to stdout too, the result is on the line with the prefix
+        for line in reversed(process.stdout.splitlines()):
+            if line.startswith(RESULT_PREFIX):
+                return json.loads(line[len(RESULT_PREFIX) :])
+        error = process.stderr.strip() or f'Worker exited with code {process.returncode}'
+        return failed_result(job['file'], error, time.perf_counter() - start)
+
+
+class BatchLog:
+    """JSON log of a batch, written again whenever a file finishes"""
+
+    def __init__(self, path: Optional[str], operations: list[dict]):
+        self.path = path
+        self.operations = operations
+        self.results = []
+        self.start_time = time.time()
+        self.finished = False
+        self.write()
+
+    def add(self, result: dict):
+        self.results.append(result)
+        self.write()
+
+    def finish(self):
+        self.finished = True
+        self.write()
+
+    def write(self):
+        if self.path is None:
+            return
+        log = {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.start_time)),
+            'seconds': time.time() - self.start_time,
+            'finished': self.finished,
+            'operations': self.operations,
+            'files': self.results,
+        }
+        # Readers never see a half written log
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(log, f, indent=2, default=str)
+        os.replace(temp_path, self.path)
+
+
+def run_job(job: dict) -> dict:
+    """Open a file, run the operations on it and save it with an incremented name. This runs in
+    the worker, inside a Maya session.
+    """
+    start = time.perf_counter()
+    result = {'file': job['file'], 'status': 'ok', 'operations': []}
+    try:
+        cmds.file(job['file'], open=True, force=True, prompt=False)
+        for operation in job['operations']:
+            operation_start = time.perf_counter()
+            value = run_operation(operation)
+            result['operations'].append(
+                {
+                    'command': operation['command'],
+                    'result': value,
+                    'seconds': time.perf_counter() - operation_start,
+                }
+            )
+        result['saved'] = save_incremented()
+    except Exception:
+        result['status'] = 'failed'
+        result['error'] = traceback.format_exc()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_operation(operation: dict):
+    """Select the nodes of an operation and run its command"""
+    commands = {
+        'tdtCleanCurves': curveCleanerCommand.tdtCleanCurves,
+        'tdtNudgeTime': nudgeCommand.tdtNudgeTime,
+        'tdtRetiming': retimingCommand.tdtRetiming,
+    }
+    name = operation['command']
+    if name not in commands:
+        raise ValueError(f"{name} can't be run in a batch, use one of {', '.join(commands)}")
+
+    select = operation.get('select')
+    if select is None:
+        select = get_animated_nodes()
+    cmds.select(select, replace=True)
+    return commands[name](**operation.get('flags', {}))
+
+
+def get_animated_nodes() -> list[str]:
+    """Get the nodes driven by anim curves"""
+    anim_curves = cmds.ls(type='animCurve')
+    if not anim_curves:
+        return []
+    nodes = cmds.listConnections(anim_curves, source=False, destination=True) or []
+    return sorted(set(nodes))
+
+
+def failed_result(file: str, error: str, seconds: float = 0.0) -> dict:
+    return {'file': file, 'status': 'failed', 'error': error, 'seconds': seconds}
+
+
+def get_default_workers() -> int:
+    """Half the CPUs, as each Maya session also uses threads of its own"""
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+# -------------------------------------------------------------------------------------------------
+
+
+def run_worker():
+    """Run the job given on stdin in a standalone Maya session and print its result"""
+    import maya.standalone
+
+    maya.standalone.initialize(name='python')
+    try:
+        result = run_job(json.load(sys.stdin))
+    finally:
+        maya.standalone.uninitialize()
+    print(RESULT_PREFIX + json.dumps(result, default=str), flush=True)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog=f'mayapy -m {__package__}.batch',
+        description='Run tradigiTOOLS commands over many Maya scene files.',
+    )
+    parser.add_argument('spec', nargs='?', help='JSON file with the list of commands to run')
+    parser.add_argument('files', nargs='*', help='.ma/.mb files to run the commands on')
+    parser.add_argument('-w', '--workers', type=int, help='Number of mayapy processes at once')
+    parser.add_argument('-l', '--log', default='batch_log.json', help='JSON log to write')
+    parser.add_argument('--mayapy', help='mayapy to run the files with (this Python by default)')
+    parser.add_argument('--timeout', type=float, help='Seconds allowed for each file')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker()
+        return 0
+    if args.spec is None or not args.files:
+        parser.error('a spec and at least one file are needed')
+
+    with open(args.spec) as f:
+        operations = json.load(f)
+    results = run_batch(
+        args.files,
+        operations,
+        log_path=args.log,
+        workers=args.workers,
+        runner=MayapyRunner(args.mayapy, args.timeout),
+    )
+    return int(any(r['status'] != 'ok' for r in results))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
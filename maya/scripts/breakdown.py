@@ -1 +1,120 @@
-# TODO
\ No newline at end of file
+"""Array based breakdown values for many anim curves at once
+
+Nothing in this module talks to Maya. Each curve is described by the key closest to the breakdown
+time, from which the keys either side of it are found, and every breakdown value is blended from
+those keys in a single step. Key indices of `-1` mean there is no such key.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+# Key times closer than this to the breakdown time are on it
+TIME_TOLERANCE = 1e-6
+
+NO_NEXT_KEY = 'No key set after the current time'
+NO_PREVIOUS_KEY = 'No key set before the current time'
+
+INVALID_ATTR_OPS = ('skipAll', 'skipObject', 'skipAttr')
+
+# Timing chart presets: each inbetween covers this fraction of the distance left to the next key
+CHART_PRESETS = {'thirds': 1 / 3, 'fifths': 1 / 5, 'sevenths': 1 / 7}
+
+
+class Neighbours(NamedTuple):
+    """The key at the breakdown time and the keys before and after it, for every curve"""
+
+    current: np.ndarray
+    previous: np.ndarray
+    next: np.ndarray
+
+
+def find_neighbours(closest_indices, closest_times, num_keys, time: float) -> Neighbours:
+    """Find the keys around `time` on every curve from the index and time of its closest key.
+    When a curve has a key at `time`, the neighbours are the keys either side of it.
+    """
+    closest_indices = np.asarray(closest_indices, dtype=int)
+    closest_times = np.asarray(closest_times, dtype=float)
+    num_keys = np.asarray(num_keys, dtype=int)
+
+    on_key = np.abs(closest_times - time) <= TIME_TOLERANCE
+    current = np.where(on_key, closest_indices, -1)
+    previous = np.where(
+        ~on_key & (closest_times < time), closest_indices, closest_indices - 1
+    )
+    next_ = np.where(~on_key & (closest_times > time), closest_indices, closest_indices + 1)
+    next_[next_ >= num_keys] = -1
+    return Neighbours(current, np.maximum(previous, -1), next_)
+
+
+def get_errors(neighbours: Neighbours, from_current: bool = False) -> np.ndarray:
+    """Get why a breakdown can't be set on each curve, an empty string when it can. With
+    `from_current` (ripple and timing chart modes) a key at the breakdown time stands in for the
+    previous key.
+    """
+    has_previous = neighbours.previous >= 0
+    if from_current:
+        has_previous |= neighbours.current >= 0
+    errors = np.full(len(neighbours.current), '', dtype=object)
+    errors[~has_previous] = NO_PREVIOUS_KEY
+    errors[neighbours.next < 0] = NO_NEXT_KEY
+    return errors
+
+
+def is_ripple_uniform(neighbours: Neighbours) -> bool:
+    """Check that either every curve or no curve has a key at the breakdown time, so a ripple
+    doesn't shift some curves and not others
+    """
+    on_key = neighbours.current >= 0
+    return bool(on_key.all() or not on_key.any())
+
+
+def skip_invalid(invalid, object_ids, invalid_attr_op: str) -> np.ndarray:
+    """Get which curves keep their breakdown given the invalid curves and the `invalidAttrOpFlag`
+    policy. Nothing is kept with `skipAll` when any curve is invalid, `skipObject` drops every
+    curve of an object with an invalid curve and `skipAttr` only drops the invalid curves.
+    """
+    invalid = np.asarray(invalid, dtype=bool)
+    object_ids = np.asarray(object_ids, dtype=int)
+    if invalid_attr_op == 'skipObject':
+        return ~np.isin(object_ids, object_ids[invalid])
+    if invalid_attr_op == 'skipAttr':
+        return ~invalid
+    return np.full(len(invalid), not invalid.any())
+
+
+def blend(previous_values, next_values, weight, stepped) -> np.ndarray:
+    """Blend the breakdown values between the previous and next values. Stepped curves (boolean
+    and enum attributes) keep the previous value. `weight` can be one value or one per curve.
+    """
+    previous_values = np.asarray(previous_values, dtype=float)
+    next_values = np.asarray(next_values, dtype=float)
+    values = (next_values - previous_values) * weight + previous_values
+    return np.where(np.asarray(stepped, dtype=bool), previous_values, values)
+
+
+def get_chart_weights(preset: str, num_frames: int, favour_next: bool = True) -> np.ndarray:
+    """Get the weights of the inbetweens of a timing chart preset. Each inbetween covers the
+    preset's fraction of the distance left, so they bunch up towards the next key (or the previous
+    one when `favour_next` is `False`).
+    """
+    fraction = CHART_PRESETS[preset]
+    weights = 1.0 - (1.0 - fraction) ** np.arange(1, num_frames + 1)
+    if not favour_next:
+        weights = 1.0 - weights[::-1]
+    return weights
+
+
+def get_chart_frames(start: float, end: float) -> np.ndarray:
+    """Get the whole frames between two keys"""
+    return np.arange(np.floor(start) + 1, np.ceil(end), dtype=float)
+
+
+def blend_chart(previous_values, next_values, weights, stepped) -> np.ndarray:
+    """Blend the values of every inbetween of a timing chart, one row per curve and one column
+    per inbetween (see `blend`)
+    """
+    previous_values = np.asarray(previous_values, dtype=float)[:, None]
+    next_values = np.asarray(next_values, dtype=float)[:, None]
+    stepped = np.asarray(stepped, dtype=bool)[:, None]
+    weights = np.asarray(weights, dtype=float)[None, :]
+    return blend(previous_values, next_values, weights, stepped)
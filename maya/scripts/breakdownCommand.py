@@ -1,5 +1,14 @@
+from typing import NamedTuple, Optional
+
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+import numpy as np
 from maya import cmds
 
+from . import breakdown, breakdownList, curveSnapshot, keyFlags, util
+from .retimingCommand import PlayheadChange, set_current_time
+from .undoableCommand import UndoableCommand
+
 
 def tdtInsertBreakdown(
     weight=0.5,
@@ -8,6 +17,9 @@ def tdtInsertBreakdown(
     invalidAttrOpFlag='skipAll',
     ignoreRippleCheck=False,
     tickDrawSpecial=False,
+    breakdownKey=False,
+    chart=None,
+    chartFavour='next',
     **kwargs,
 ):
     """Insert breakdowns, for keyframable attributes, on selected objects.
@@ -44,18 +56,42 @@ def tdtInsertBreakdown(
             Sets the special drawing state for the breakdowns when it is drawn in as a tick in the
             timeline. Defaults to `False`.
 
+        breakdownKey|bk (bool, optional):
+            Make the breakdowns Maya breakdown keys, which keep their place between the keys
+            either side of them when those are moved. An existing key at the current time that
+            is given the breakdown value becomes a breakdown key too. Defaults to `False`.
+
+        chart|ch (str | list[tuple[float, float]], optional):
+            Insert every inbetween of a timing chart at once, between the key at or before the
+            current time and the key after it. Either a preset ("thirds", "fifths" or
+            "sevenths"), which puts an inbetween on every frame between the keys, or a list of
+            `(frame, weight)` pairs. The keys either side of the current time must be on the
+            same frames for every attribute. The weight flag is not used. Defaults to `None`.
+
+        chartFavour|cf (str, optional):
+            The key the inbetweens of a chart preset favour, "next" or "previous". Defaults to
+            `'next'`.
+
+    Returns:
+        int: The number of breakdowns set.
+
     """
-    BreakdownCommand(
+    return BreakdownCommand(
         weight=kwargs.get('w', weight),
         selectedAttr=kwargs.get('sa', selectedAttr),
         mode=kwargs.get('m', mode),
         invalidAttrOpFlag=kwargs.get('iao', invalidAttrOpFlag),
         ignoreRippleCheck=kwargs.get('irc', ignoreRippleCheck),
         tickDrawSpecial=kwargs.get('tds', tickDrawSpecial),
+        breakdownKey=kwargs.get('bk', breakdownKey),
+        chart=kwargs.get('ch', chart),
+        chartFavour=kwargs.get('cf', chartFavour),
     ).run()
 
 
-class BreakdownCommand:
+class BreakdownCommand(UndoableCommand):
+    VALID_ANIMCURVES = breakdownList.VALID_ANIMCURVES
+
     def __init__(
         self,
         weight=0.5,
@@ -64,7 +100,12 @@ class BreakdownCommand:
         invalidAttrOpFlag='skipAll',
         ignoreRippleCheck=False,
         tickDrawSpecial=False,
+        breakdownKey=False,
+        chart=None,
+        chartFavour='next',
     ):
+        super().__init__()
+
         self.current_animation_frame = cmds.currentTime(query=True)
 
         self.breakdown_weight = weight
@@ -73,12 +114,390 @@ class BreakdownCommand:
         self.invalid_attr_op = invalidAttrOpFlag
         self.ignore_ripple_check = ignoreRippleCheck
         self.tick_draw_special = tickDrawSpecial
+        self.breakdown_key = breakdownKey
+        self.chart = chart
+        self.chart_favour = chartFavour
+
+        if self.breakdown_mode not in ('overwrite', 'ripple'):
+            cmds.warning('Invalid argument for mode. Using default value.')
+            self.breakdown_mode = 'overwrite'
+        if self.invalid_attr_op not in breakdown.INVALID_ATTR_OPS:
+            cmds.warning('Invalid argument for invalidAttrOp. Using default value.')
+            self.invalid_attr_op = 'skipAll'
+        if self.chart_favour not in ('next', 'previous'):
+            cmds.warning('Invalid argument for chartFavour. Using default value.')
+            self.chart_favour = 'next'
+        if self.breakdown_mode == 'ripple' and self.selected_attr_only:
+            self.selected_attr_only = False
+            cmds.warning('Selected attribute flag is ignored in Ripple Mode')
 
         self.attributes_skipped = False
         self.objects_skipped = False
+        self.num_breakdowns = 0
+
+        # Interactive session (see `begin`)
+        self.session = None
 
-        # TODO ?
+        self.selected = util.get_selected_nodes()
 
     def run(self):
-        # TODO
-        raise NotImplementedError
+        breakdowns = self.prepare()
+        if breakdowns is None:
+            return None
+
+        if self.chart is not None:
+            chart = self.get_chart(breakdowns)
+            if chart is None:
+                return None
+            self.apply_chart(breakdowns, *chart)
+        elif self.breakdown_mode == 'ripple':
+            self.apply_ripple(breakdowns, breakdowns.get_values(self.breakdown_weight))
+        else:
+            self.apply(breakdowns, breakdowns.get_values(self.breakdown_weight))
+        self.display_result()
+        return self.num_breakdowns
+
+    def prepare(self) -> Optional[breakdownList.BreakdownList]:
+        """Check the selection and find the breakdowns to set, `None` when there is an error"""
+        if isinstance(self.chart, str) and self.chart not in breakdown.CHART_PRESETS:
+            om2.MGlobal.displayError(
+                f'Invalid chart preset. Use one of {", ".join(breakdown.CHART_PRESETS)}'
+            )
+            return None
+        if self.chart is not None and self.breakdown_mode == 'ripple':
+            om2.MGlobal.displayError('Timing charts can only be set in overwrite mode')
+            return None
+
+        if not self.selected:
+            om2.MGlobal.displayError('No Objects Selected')
+            return None
+
+        attributes = None
+        if self.selected_attr_only:
+            attributes = get_selected_attributes()
+            if not attributes:
+                om2.MGlobal.displayError('No Attributes Selected')
+                return None
+
+        breakdowns = self.create_breakdown_list(attributes)
+        if breakdowns is None:
+            return None
+        if not len(breakdowns):
+            om2.MGlobal.displayError(
+                'No attributes were found to set breakdowns on. (See Script Editor)'
+            )
+            return None
+
+        if (
+            self.breakdown_mode == 'ripple'
+            and not self.ignore_ripple_check
+            and not breakdown.is_ripple_uniform(breakdowns.neighbours)
+        ):
+            om2.MGlobal.displayError(
+                'Breakdown Failed. (Ripple Mode) All attributes must have a key set or no keys '
+                'set at the current time.'
+            )
+            return None
+        return breakdowns
+
+    def display_result(self):
+        result = f'Result: {self.num_breakdowns}'
+        if self.attributes_skipped:
+            result += '   (See Script Editor for skipped attributes)'
+        elif self.objects_skipped:
+            result += '   (See Script Editor for skipped objects)'
+        om2.MGlobal.displayInfo(result)
+
+    # Interactive session -----------------------------------------------------------------------
+    #
+    # A slider drag sets the breakdowns with `begin`, moves them with `update` on every change of
+    # the weight, and puts them on the undo queue with `end`. The keys around the current frame are
+    # only found once, so an update just blends the values and sets them.
+
+    def begin(self) -> bool:
+        """Set the breakdowns at the command's weight and start an interactive session. Returns
+        `False` when no breakdowns could be set.
+        """
+        if self.breakdown_mode == 'ripple':
+            om2.MGlobal.displayError("Ripple breakdowns can't be set interactively")
+            return False
+        breakdowns = self.prepare()
+        if breakdowns is None:
+            return False
+
+        anim_change = oma2.MAnimCurveChange()
+        values = breakdowns.get_values(self.breakdown_weight)
+        indices = self.set_keys(breakdowns, values, anim_change)
+        self.session = BreakdownSession(
+            breakdowns, breakdowns.get_functions(), indices, anim_change
+        )
+        return True
+
+    def update(self, weight: float):
+        """Move the breakdowns of the session to a new weight"""
+        if self.session is None:
+            return
+        self.breakdown_weight = weight
+        values = self.session.breakdowns.get_values(weight)
+        for fn, index, value in zip(
+            self.session.functions, self.session.indices.tolist(), values.tolist()
+        ):
+            fn.setValue(index, value)
+
+    def end(self):
+        """Finish the session, adding the breakdowns at their last weight as one undo entry"""
+        if self.session is None:
+            return
+        session, self.session = self.session, None
+
+        # Setting the values again through the change makes redo restore the last weight, undo
+        # still goes back to the values from before the session
+        values = session.breakdowns.get_values(self.breakdown_weight)
+        for fn, index, value in zip(session.functions, session.indices.tolist(), values.tolist()):
+            fn.setValue(index, value, change=session.anim_change)
+        self.finish(session.breakdowns, session.indices, session.anim_change)
+        self.display_result()
+
+    def create_breakdown_list(self, attributes=None) -> Optional[breakdownList.BreakdownList]:
+        """Find the curves to set breakdowns on and the keys around the current frame. Curves that
+        can't have a breakdown are dropped following the `invalidAttrOpFlag` policy before any key
+        value is read, `None` is returned when nothing should be set.
+        """
+        targets = breakdownList.find_targets(self.selected, attributes)
+        breakdowns = breakdownList.BreakdownList(targets, self.current_animation_frame)
+        # Ripples and charts start from the key at the current time when there is one
+        from_current = self.breakdown_mode == 'ripple' or self.chart is not None
+        errors = breakdowns.get_errors(from_current)
+        invalid = errors != ''
+        if not invalid.any():
+            breakdowns.read_neighbour_values(from_current)
+            return breakdowns
+
+        keep = breakdown.skip_invalid(invalid, breakdowns.object_ids, self.invalid_attr_op)
+        if self.invalid_attr_op == 'skipAll':
+            i = int(np.flatnonzero(invalid)[0])
+            om2.MGlobal.displayInfo(f'{get_plug_name(targets[i].plug)} --> {errors[i]}')
+            om2.MGlobal.displayError(
+                'Skipping All Objects (See Script Editor for Invalid Attribute)'
+            )
+            return None
+
+        if self.invalid_attr_op == 'skipObject':
+            for object_id in np.unique(breakdowns.object_ids[invalid]).tolist():
+                node = self.selected[object_id].object()
+                om2.MGlobal.displayInfo(f'Skipping Object: {util.get_name(node)}')
+            self.objects_skipped = True
+        else:
+            for i in np.flatnonzero(invalid).tolist():
+                om2.MGlobal.displayInfo(
+                    f'Skipping Attribute: {get_plug_name(targets[i].plug)} ({errors[i]})'
+                )
+            self.attributes_skipped = True
+        breakdowns = breakdowns.subset(keep)
+        breakdowns.read_neighbour_values(from_current)
+        return breakdowns
+
+    def apply(self, breakdowns: breakdownList.BreakdownList, values: np.ndarray):
+        """Set a key with the breakdown value on every curve"""
+        anim_change = oma2.MAnimCurveChange()
+        indices = self.set_keys(breakdowns, values, anim_change)
+        self.finish(breakdowns, indices, anim_change)
+
+    def get_chart(
+        self, breakdowns: breakdownList.BreakdownList
+    ) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """Get the frames and weights of the timing chart inbetweens. Every curve is blended
+        between its own keys with the same weights, so all the curves must have their keys either
+        side of the current time on the same frames.
+        """
+        start = float(np.min(breakdowns.previous_times))
+        end = float(np.max(breakdowns.next_times))
+        if (
+            float(np.max(breakdowns.previous_times)) - start > breakdown.TIME_TOLERANCE
+            or end - float(np.min(breakdowns.next_times)) > breakdown.TIME_TOLERANCE
+        ):
+            om2.MGlobal.displayError(
+                'Timing charts need the keys either side of the current time on the same frames '
+                'for all attributes'
+            )
+            return None
+
+        if isinstance(self.chart, str):
+            frames = breakdown.get_chart_frames(start, end)
+            weights = breakdown.get_chart_weights(
+                self.chart, len(frames), favour_next=self.chart_favour == 'next'
+            )
+        else:
+            chart = np.asarray(self.chart, dtype=float).reshape(-1, 2)
+            order = np.argsort(chart[:, 0])
+            frames, weights = chart[order, 0], chart[order, 1]
+            if np.any((frames <= start) | (frames >= end)) or np.any(np.diff(frames) == 0):
+                om2.MGlobal.displayError(
+                    'Chart frames must be different frames between the keys around the current '
+                    'time'
+                )
+                return None
+
+        if not len(frames):
+            om2.MGlobal.displayError('No frames between the keys around the current time')
+            return None
+        return frames, weights
+
+    def apply_chart(
+        self, breakdowns: breakdownList.BreakdownList, frames: np.ndarray, weights: np.ndarray
+    ):
+        """Add every inbetween of a timing chart to every curve, one `addKeys` call per curve
+        (time curves, which `addKeys` can't write, get a key at a time)
+        """
+        values = breakdown.blend_chart(
+            breakdowns.previous_values, breakdowns.next_values, weights, breakdowns.stepped
+        )
+        time_unit = om2.MTime.uiUnit()
+        times = om2.MTimeArray([om2.MTime(frame, time_unit) for frame in frames.tolist()])
+        anim_change = oma2.MAnimCurveChange()
+        indices = np.zeros(values.shape, dtype=int)
+        for i, (fn, target, curve_values) in enumerate(
+            zip(breakdowns.get_functions(), breakdowns.targets, values.tolist())
+        ):
+            out_tangent = oma2.MFnAnimCurve.kTangentGlobal
+            if target.stepped:
+                out_tangent = oma2.MFnAnimCurve.kTangentStep
+            if fn.animCurveType in curveSnapshot.BULK_CURVE_TYPES:
+                fn.addKeys(
+                    times,
+                    curve_values,
+                    tangentInType=oma2.MFnAnimCurve.kTangentGlobal,
+                    tangentOutType=out_tangent,
+                    keepExistingKeys=True,
+                    change=anim_change,
+                )
+            else:
+                for time, value in zip(times, curve_values):
+                    fn.addKey(
+                        time,
+                        value,
+                        tangentInType=oma2.MFnAnimCurve.kTangentGlobal,
+                        tangentOutType=out_tangent,
+                        change=anim_change,
+                    )
+            # The inbetweens sit next to each other on the curve
+            first = fn.find(times[0])
+            indices[i] = np.arange(first, first + len(frames))
+        self.finish(breakdowns, indices, anim_change)
+
+    def apply_ripple(self, breakdowns: breakdownList.BreakdownList, values: np.ndarray):
+        """Insert the breakdowns a frame after the keys at the current time, shifting every later
+        key on those curves by a frame. Curves without a key at the current time get their
+        breakdown as in overwrite mode. The playhead moves to the breakdown.
+
+        Only the keys after the key at the current time are moved, all at once, and undo only
+        holds those keys (see `UndoableCommand.shift_keys`).
+        """
+        rippled = breakdowns.neighbours.current >= 0
+        anim_change = oma2.MAnimCurveChange()
+        indices = np.zeros(len(breakdowns), dtype=int)
+        if not rippled.all():
+            overwrite = breakdowns.subset(~rippled)
+            indices[~rippled] = self.set_keys(overwrite, values[~rippled], anim_change)
+
+        breakdown_time = self.current_animation_frame + 1
+        mtime = om2.MTime(breakdown_time, om2.MTime.uiUnit())
+        frame_ticks = 1.0 / curveSnapshot.get_ui_time_scale()
+        currents = breakdowns.neighbours.current
+        for i in np.flatnonzero(rippled).tolist():
+            target = breakdowns.targets[i]
+            fn = oma2.MFnAnimCurve(target.anim_curve.object())
+            if currents[i] + 1 < fn.numKeys:
+                self.shift_keys(target.anim_curve, int(currents[i]) + 1, frame_ticks)
+
+            out_tangent = oma2.MFnAnimCurve.kTangentGlobal
+            if target.stepped:
+                out_tangent = oma2.MFnAnimCurve.kTangentStep
+            indices[i] = fn.addKey(
+                mtime,
+                float(values[i]),
+                tangentInType=oma2.MFnAnimCurve.kTangentGlobal,
+                tangentOutType=out_tangent,
+                change=anim_change,
+            )
+
+        if rippled.any():
+            set_current_time(breakdown_time)
+            self.add_change(PlayheadChange(self.current_animation_frame, breakdown_time))
+        self.finish(breakdowns, indices, anim_change)
+
+    def set_keys(
+        self,
+        breakdowns: breakdownList.BreakdownList,
+        values: np.ndarray,
+        anim_change: oma2.MAnimCurveChange,
+    ) -> np.ndarray:
+        """Set the breakdown values, returning the index of the breakdown key on every curve.
+        Existing keys at the current frame are given the new value, other curves get a new key.
+        """
+        time = om2.MTime(self.current_animation_frame, om2.MTime.uiUnit())
+        indices = np.zeros(len(breakdowns), dtype=int)
+        functions = breakdowns.get_functions()
+        currents = breakdowns.neighbours.current.tolist()
+        for i, (fn, target, current, value) in enumerate(
+            zip(functions, breakdowns.targets, currents, values.tolist())
+        ):
+            if current >= 0:
+                fn.setValue(current, value, change=anim_change)
+                index = current
+            else:
+                out_tangent = oma2.MFnAnimCurve.kTangentGlobal
+                if target.stepped:
+                    out_tangent = oma2.MFnAnimCurve.kTangentStep
+                index = fn.addKey(
+                    time,
+                    value,
+                    tangentInType=oma2.MFnAnimCurve.kTangentGlobal,
+                    tangentOutType=out_tangent,
+                    change=anim_change,
+                )
+            indices[i] = index
+        return indices
+
+    def finish(
+        self,
+        breakdowns: breakdownList.BreakdownList,
+        indices: np.ndarray,
+        anim_change: oma2.MAnimCurveChange,
+    ):
+        """Mark the breakdown keys and put the command on the undo queue. `indices` holds the key
+        index of each breakdown, one row per curve when a curve has several.
+        """
+        indices = indices.reshape(len(breakdowns), -1)
+        self.add_change(anim_change)
+        flags = {}
+        if self.breakdown_key:
+            flags[keyFlags.BREAKDOWN] = True
+        if self.tick_draw_special:
+            flags[keyFlags.TICK_DRAW_SPECIAL] = True
+        if flags:
+            anim_curves = [t.anim_curve for t in breakdowns.targets]
+            self.add_change(keyFlags.set_flags(anim_curves, indices, flags))
+        self.num_breakdowns = indices.size
+        self.commit()
+
+
+class BreakdownSession(NamedTuple):
+    """The breakdowns being set interactively, with the function set and key index of each"""
+
+    breakdowns: breakdownList.BreakdownList
+    functions: list[oma2.MFnAnimCurve]
+    indices: np.ndarray
+    anim_change: oma2.MAnimCurveChange
+
+
+# -------------------------------------------------------------------------------------------------
+
+
+def get_selected_attributes() -> list[str]:
+    """Get the (short) names of the attributes highlighted in the channel box"""
+    return cmds.channelBox('mainChannelBox', query=True, selectedMainAttributes=True) or []
+
+
+def get_plug_name(plug: om2.MPlug) -> str:
+    return plug.partialName(includeNodeName=True)
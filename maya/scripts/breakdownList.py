@@ -1 +1,154 @@
-# TODO
\ No newline at end of file
+"""The anim curves to set breakdowns on, held as arrays
+
+The curves come from the attribute tables of the nodes (see `attributeTable`), so finding them is
+an array lookup per node. Finding the keys around the breakdown time costs a `findClosest` call per
+curve and the neighbouring values are only read once the curves that can't have a breakdown have
+been dropped, the keys of a curve are never read in full. Everything else about the breakdowns is
+worked out for all the curves at once by `breakdown`.
+"""
+from typing import NamedTuple, Optional
+
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+import numpy as np
+
+from . import attributeTable, breakdown
+
+# Driven keys have no time input, so only time based curves get breakdowns
+VALID_ANIMCURVES = ['animCurveTA', 'animCurveTL', 'animCurveTT', 'animCurveTU']
+
+
+class BreakdownTarget(NamedTuple):
+    """An animated attribute to set a breakdown on"""
+
+    plug: om2.MPlug
+    anim_curve: om2.MObjectHandle
+    object_id: int
+    stepped: bool
+
+
+def find_targets(
+    nodes: list[om2.MObjectHandle], attributes: Optional[list[str]] = None
+) -> list[BreakdownTarget]:
+    """Find the anim curves of the nodes' keyable, unlocked attributes. Attributes animated on anim
+    layers or driven by anything but their curve are left out. With `attributes`, only attributes
+    with those (short) names are used.
+    """
+    cache = attributeTable.get_cache()
+    targets = []
+    visited = set()
+    for object_id, node in enumerate(nodes):
+        if not node.isValid():
+            continue
+        table = cache.get_table(node.object())
+        valid = ~table.locked & ~table.driven & ~table.layered
+        valid &= np.isin(table.curve_types, VALID_ANIMCURVES)
+        if attributes is not None:
+            valid &= np.isin(table.names, attributes)
+        for i in np.flatnonzero(valid).tolist():
+            anim_curve = table.curves[i]
+            key = anim_curve.hashCode()
+            if key in visited:
+                continue
+            visited.add(key)
+            targets.append(
+                BreakdownTarget(
+                    plug=table.plugs[i],
+                    anim_curve=anim_curve,
+                    object_id=object_id,
+                    stepped=bool(table.stepped[i]),
+                )
+            )
+    return targets
+
+
+class BreakdownList:
+    """The breakdown targets with the keys around the breakdown time
+
+    `time` is in the current time unit. Key values are in internal units, as `MFnAnimCurve` reads
+    and writes them.
+    """
+
+    def __init__(self, targets: list[BreakdownTarget], time: float):
+        self.targets = targets
+        self.time = time
+        self.object_ids = np.array([t.object_id for t in targets], dtype=int)
+        self.stepped = np.array([t.stepped for t in targets], dtype=bool)
+
+        mtime = om2.MTime(time, om2.MTime.uiUnit())
+        closest_indices = np.zeros(len(targets), dtype=int)
+        closest_times = np.zeros(len(targets))
+        num_keys = np.zeros(len(targets), dtype=int)
+        for i, fn in enumerate(self.get_functions()):
+            num_keys[i] = fn.numKeys
+            if num_keys[i]:
+                closest_indices[i] = fn.findClosest(mtime)
+                closest_times[i] = fn.input(int(closest_indices[i])).asUnits(om2.MTime.uiUnit())
+        self.num_keys = num_keys
+        self.neighbours = breakdown.find_neighbours(closest_indices, closest_times, num_keys, time)
+        # Curves without keys have no neighbours at all
+        for indices in self.neighbours:
+            indices[num_keys == 0] = -1
+
+        self.previous_values = None
+        self.next_values = None
+        self.previous_times = None
+        self.next_times = None
+
+    def read_neighbour_values(self, from_current: bool = False):
+        """Read the values and times of the keys either side of the breakdown time. With
+        `from_current`, a key at the breakdown time is used as the previous key.
+        """
+        previous = self.neighbours.previous
+        if from_current:
+            previous = np.where(self.neighbours.current >= 0, self.neighbours.current, previous)
+        self.previous_values = self.read_values(previous)
+        self.next_values = self.read_values(self.neighbours.next)
+        self.previous_times = self.read_times(previous)
+        self.next_times = self.read_times(self.neighbours.next)
+
+    def __len__(self):
+        return len(self.targets)
+
+    def get_functions(self) -> list[oma2.MFnAnimCurve]:
+        return [oma2.MFnAnimCurve(t.anim_curve.object()) for t in self.targets]
+
+    def read_values(self, indices: np.ndarray) -> np.ndarray:
+        """Read the value of a key on each curve, `nan` where the index is `-1`"""
+        values = np.full(len(self.targets), np.nan)
+        for i, (target, index) in enumerate(zip(self.targets, indices.tolist())):
+            if index >= 0:
+                values[i] = oma2.MFnAnimCurve(target.anim_curve.object()).value(index)
+        return values
+
+    def read_times(self, indices: np.ndarray) -> np.ndarray:
+        """Read the time of a key on each curve, `nan` where the index is `-1`"""
+        times = np.full(len(self.targets), np.nan)
+        for i, (target, index) in enumerate(zip(self.targets, indices.tolist())):
+            if index >= 0:
+                fn = oma2.MFnAnimCurve(target.anim_curve.object())
+                times[i] = fn.input(index).asUnits(om2.MTime.uiUnit())
+        return times
+
+    def get_errors(self, from_current: bool = False) -> np.ndarray:
+        """See `breakdown.get_errors`"""
+        return breakdown.get_errors(self.neighbours, from_current)
+
+    def get_values(self, weight) -> np.ndarray:
+        """Get the breakdown value of every curve for a weight (or one weight per curve)"""
+        return breakdown.blend(self.previous_values, self.next_values, weight, self.stepped)
+
+    def subset(self, mask: np.ndarray) -> 'BreakdownList':
+        """Get the list of the targets where `mask` is set, without reading the curves again"""
+        mask = np.asarray(mask, dtype=bool)
+        subset = BreakdownList.__new__(BreakdownList)
+        subset.targets = [t for t, keep in zip(self.targets, mask.tolist()) if keep]
+        subset.time = self.time
+        subset.object_ids = self.object_ids[mask]
+        subset.stepped = self.stepped[mask]
+        subset.num_keys = self.num_keys[mask]
+        subset.neighbours = breakdown.Neighbours(*(indices[mask] for indices in self.neighbours))
+        for name in ('previous_values', 'next_values', 'previous_times', 'next_times'):
+            values = getattr(self, name)
+            setattr(subset, name, None if values is None else values[mask])
+        return subset
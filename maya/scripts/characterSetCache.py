@@ -0,0 +1,118 @@
+"""Cache of the character set hierarchy in the scene
+
+The hierarchy (each character set and its direct subsets) is read once and marked dirty by
+callbacks whenever a character set is added, removed, renamed or connected to another character
+set. It is only read again the next time it is needed, so expanding character sets is usually a
+dictionary lookup.
+"""
+import maya.api.OpenMaya as om2
+
+
+class CharacterSetCache:
+    def __init__(self):
+        self.subsets = None
+        self.nodes = {}
+        self.callback_ids = []
+
+    def install_callbacks(self):
+        """Start listening for changes to the character set hierarchy"""
+        if self.callback_ids:
+            return
+        self.callback_ids = [
+            om2.MDGMessage.addNodeAddedCallback(self._on_node_changed, 'character'),
+            om2.MDGMessage.addNodeRemovedCallback(self._on_node_changed, 'character'),
+            om2.MDGMessage.addConnectionCallback(self._on_connection),
+            om2.MNodeMessage.addNameChangedCallback(om2.MObject.kNullObj, self._on_name_changed),
+        ]
+
+    def remove_callbacks(self):
+        if self.callback_ids:
+            om2.MMessage.removeCallbacks(self.callback_ids)
+        self.callback_ids = []
+
+    def invalidate(self):
+        self.subsets = None
+        self.nodes = {}
+
+    def get_subsets(self) -> dict[str, list[str]]:
+        """Get the direct sub character sets of every character set in the scene"""
+        if self.subsets is None:
+            self.subsets, self.nodes = read_character_sets()
+        return self.subsets
+
+    def is_character_set(self, node: str) -> bool:
+        return node in self.get_subsets()
+
+    def expand(self, nodes: list[str]) -> list[str]:
+        """Create a list of the character sets in `nodes` followed by each of their subsets. Other
+        nodes are ignored. Each character set is only listed once, even if the hierarchy has a
+        cycle.
+        """
+        subsets = self.get_subsets()
+        results = []
+        visited = set()
+        stack = [n for n in reversed(list(nodes)) if n in subsets]
+        while stack:
+            character_set = stack.pop()
+            if character_set in visited:
+                continue
+            visited.add(character_set)
+            results.append(character_set)
+            stack.extend(reversed(subsets[character_set]))
+        return results
+
+    def expand_nodes(self, nodes: list[om2.MObject]) -> list[om2.MObjectHandle]:
+        """Same as `expand`, working on node objects rather than names"""
+        names = [om2.MFnDependencyNode(n).name() for n in nodes if n.hasFn(om2.MFn.kCharacter)]
+        return [self.nodes[name] for name in self.expand(names)]
+
+    def _on_node_changed(self, node, client_data):
+        self.invalidate()
+
+    def _on_connection(self, src_plug, dst_plug, made, client_data):
+        # Sub character sets are connected to the character set they are a member of
+        if src_plug.node().hasFn(om2.MFn.kCharacter) and dst_plug.node().hasFn(om2.MFn.kCharacter):
+            self.invalidate()
+
+    def _on_name_changed(self, node, prev_name, client_data):
+        if node.hasFn(om2.MFn.kCharacter):
+            self.invalidate()
+
+
+def read_character_sets() -> tuple[dict[str, list[str]], dict[str, om2.MObjectHandle]]:
+    """Read every character set in the scene along with its direct sub character sets. The
+    character sets' node handles are returned by name as well.
+    """
+    subsets = {}
+    nodes = {}
+    node_iter = om2.MItDependencyNodes(om2.MFn.kCharacter)
+    while not node_iter.isDone():
+        character_set = node_iter.thisNode()
+        members = om2.MFnSet(character_set).getMembers(False)
+        children = []
+        for i in range(members.length()):
+            member = members.getDependNode(i)
+            if member.hasFn(om2.MFn.kCharacter) and member != character_set:
+                name = om2.MFnDependencyNode(member).name()
+                if name not in children:
+                    children.append(name)
+        name = om2.MFnDependencyNode(character_set).name()
+        subsets[name] = children
+        nodes[name] = om2.MObjectHandle(character_set)
+        node_iter.next()
+    return subsets, nodes
+
+
+# The cache created before this module was reloaded still has callbacks registered
+if globals().get('_cache') is not None:
+    _cache.remove_callbacks()
+_cache = None
+
+
+def get_cache() -> CharacterSetCache:
+    """Get the character set cache shared by all commands"""
+    global _cache
+    if _cache is None:
+        _cache = CharacterSetCache()
+        _cache.install_callbacks()
+    return _cache
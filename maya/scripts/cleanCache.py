@@ -0,0 +1,122 @@
+"""Record of the anim curves that are already clean
+
+After a clean, each curve is stored with the settings it was cleaned with and a fingerprint of its
+keys. An anim curve edited callback marks curves as dirty when their keys change. A curve that was
+not marked dirty is skipped without reading its keys, a dirty curve is only cleaned again if its
+fingerprint no longer matches.
+
+The callback is suspended while the cleaner writes its own edits, so the curves it cleaned stay
+clean. Undo and redo rewrite curves without the callback being relied on, the records of those
+curves are dropped instead (see `discard`).
+"""
+from contextlib import contextmanager
+
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+
+from . import curveSnapshot
+
+
+class CleanRecord:
+    def __init__(self, anim_curve: om2.MObjectHandle, settings_key, fingerprint: bytes):
+        self.anim_curve = anim_curve
+        self.settings_key = settings_key
+        self.fingerprint = fingerprint
+        self.dirty = False
+
+
+class CleanCache:
+    def __init__(self):
+        self.records = {}
+        self.callback_ids = []
+        self.suspended = False
+
+    def install_callbacks(self):
+        """Start listening for edits to anim curves"""
+        if not self.callback_ids:
+            self.callback_ids.append(
+                oma2.MAnimMessage.addAnimCurveEditedCallback(self._on_curves_edited)
+            )
+
+    def remove_callbacks(self):
+        if self.callback_ids:
+            om2.MMessage.removeCallbacks(self.callback_ids)
+        self.callback_ids = []
+
+    def clear(self):
+        self.records.clear()
+
+    @contextmanager
+    def suspend(self):
+        """Context for edits that shouldn't mark curves as dirty, such as the clean itself"""
+        suspended = self.suspended
+        self.suspended = True
+        try:
+            yield
+        finally:
+            self.suspended = suspended
+
+    def discard(self, anim_curve: om2.MObjectHandle):
+        """Forget that a curve was cleaned"""
+        self.records.pop(anim_curve.hashCode(), None)
+
+    def is_clean(self, anim_curve: om2.MObjectHandle, settings_key) -> bool:
+        """Check if a curve was cleaned with the same settings and has not changed since"""
+        key = anim_curve.hashCode()
+        record = self.records.get(key)
+        if record is None:
+            return False
+        if (
+            not record.anim_curve.isValid()
+            or record.anim_curve.object() != anim_curve.object()
+            or record.settings_key != settings_key
+        ):
+            del self.records[key]
+            return False
+
+        if record.dirty:
+            data = curveSnapshot.read_curve(oma2.MFnAnimCurve(anim_curve.object()))
+            if curveSnapshot.fingerprint(data) != record.fingerprint:
+                del self.records[key]
+                return False
+            record.dirty = False
+        return True
+
+    def mark_clean(
+        self, anim_curve: om2.MObjectHandle, settings_key, data: curveSnapshot.CurveData
+    ):
+        """Record a curve as cleaned with the given settings, `data` being its cleaned keys"""
+        self.records[anim_curve.hashCode()] = CleanRecord(
+            anim_curve, settings_key, curveSnapshot.fingerprint(data)
+        )
+
+    def _on_curves_edited(self, edited_curves, client_data):
+        if self.suspended:
+            return
+        for anim_curve in edited_curves:
+            record = self.records.get(om2.MObjectHandle(anim_curve).hashCode())
+            if record is not None:
+                record.dirty = True
+
+
+# The cache created before this module was reloaded still has callbacks registered
+if globals().get('_cache') is not None:
+    _cache.remove_callbacks()
+_cache = None
+
+
+def get_cache() -> CleanCache:
+    """Get the clean cache shared by all cleans"""
+    global _cache
+    if _cache is None:
+        _cache = CleanCache()
+        _cache.install_callbacks()
+    return _cache
+
+
+def discard(anim_curve: om2.MObjectHandle):
+    """Forget that a curve was cleaned, when its keys were rewritten (e.g. by undo). Nothing is
+    done when there hasn't been a clean yet.
+    """
+    if _cache is not None:
+        _cache.discard(anim_curve)
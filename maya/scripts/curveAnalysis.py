@@ -0,0 +1,484 @@
+"""Array based analysis of animation curve keys.
+
+Nothing in this module talks to Maya. Key times and values are passed in as sequences (converted to
+NumPy arrays) and all results are returned as arrays with one entry per key.
+"""
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# reduce_keys tries to remove every Nth kept key in a pass. Keys this far apart don't share a
+# segment whose tangents change when they are removed
+REMOVAL_SPACING = 6
+
+# Fewer curves than this are planned on the calling thread, a pool costs more than it saves
+PARALLEL_MIN_CURVES = 64
+
+
+class TangentSolution(NamedTuple):
+    """Per key results of the tangent cleaning analysis
+
+    Angles are in radians and describe the tangent in the same units as the key times and values
+    that were analysed.
+    """
+
+    peak_or_valley: np.ndarray
+    angle_in: np.ndarray
+    angle_out: np.ndarray
+    smoothed: np.ndarray
+    tangent_angles: np.ndarray
+    tangent_weights: np.ndarray
+
+
+def get_peaks_and_valleys(values) -> np.ndarray:
+    """Flag the keys that sit on a peak or a valley of the curve
+
+    Flat plateaus are compared against the last value before the plateau and the first value after
+    it, so every key on a plateau that tops or bottoms out the curve is a peak/valley. A plateau
+    that runs to the start or end of the curve counts as a peak/valley. The first and last keys are
+    never flagged.
+    """
+    values = np.asarray(values, dtype=float)
+    num_keys = len(values)
+    if num_keys < 3:
+        return np.zeros(num_keys, dtype=bool)
+
+    # Split the keys into runs of equal values
+    changed = values[1:] != values[:-1]
+    run_ids = np.concatenate(([0], np.cumsum(changed)))
+    run_starts = np.flatnonzero(np.concatenate(([True], changed)))
+    run_ends = np.concatenate((run_starts[1:] - 1, [num_keys - 1]))
+    starts = run_starts[run_ids]
+    ends = run_ends[run_ids]
+
+    # The last inequal value before and the next inequal value after each key. Without one, the
+    # key's own value is used
+    prev_inequal = np.where(starts > 0, values[np.maximum(starts - 1, 0)], values)
+    next_inequal = np.where(ends < num_keys - 1, values[np.minimum(ends + 1, num_keys - 1)], values)
+
+    peak_or_valley = ((values <= prev_inequal) & (values <= next_inequal)) | (
+        (values >= prev_inequal) & (values >= next_inequal)
+    )
+    peak_or_valley[0] = False
+    peak_or_valley[-1] = False
+    return peak_or_valley
+
+
+def get_redundant_keys(values) -> np.ndarray:
+    """Flag the keys with the same value as the keys either side of them. These keys don't affect
+    the shape of the curve. The first and last keys are never flagged.
+    """
+    values = np.asarray(values, dtype=float)
+    redundant = np.zeros(len(values), dtype=bool)
+    if len(values) > 2:
+        redundant[1:-1] = (values[1:-1] == values[:-2]) & (values[1:-1] == values[2:])
+    return redundant
+
+
+def get_angles(times, values) -> tuple[np.ndarray, np.ndarray]:
+    """Get the angles of the lines joining each key to its previous (in) and next (out) key
+
+    The in angle of the first key and the out angle of the last key are 0.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    num_keys = len(times)
+
+    angle_in = np.zeros(num_keys)
+    angle_out = np.zeros(num_keys)
+    if num_keys > 1:
+        slopes = np.arctan(np.diff(values) / np.diff(times))
+        angle_in[1:] = slopes
+        angle_out[:-1] = slopes
+    return angle_in, angle_out
+
+
+def solve_tangents(
+    times,
+    values,
+    smoothing_value: float = 0.0,
+    weight_factor: float = 0.333,
+    smooth_all_splines: bool = False,
+) -> TangentSolution:
+    """Work out the tangents to flatten peaks and valleys and spline the remaining keys without
+    overshoot.
+
+    Only the keys flagged as `smoothed` get a new tangent angle and weight; `tangent_angles` and
+    `tangent_weights` hold `0` for every other key.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    num_keys = len(times)
+
+    peak_or_valley = get_peaks_and_valleys(values)
+    angle_in, angle_out = get_angles(times, values)
+
+    # Determine if the smoothing should be applied to the spline. If not in a smooth all splines
+    # mode, only splines next to a peak or valley will be smoothed
+    smoothed = np.zeros(num_keys, dtype=bool)
+    if num_keys > 2:
+        next_to_peak = peak_or_valley[:-2] | peak_or_valley[2:]
+        smoothed[1:-1] = ~peak_or_valley[1:-1] & (smooth_all_splines | next_to_peak)
+
+    # The smallest angle is used to avoid overshoots
+    tangent_angles = np.where(np.abs(angle_out) > np.abs(angle_in), angle_in, angle_out)
+
+    # Add or subtract the smoothing value (softness) depending on positive or negative slope
+    softness = np.abs(angle_out - angle_in) * smoothing_value
+    positive = (angle_in > 0) | ((angle_in == 0) & (angle_out > 0))
+    tangent_angles = np.where(positive, tangent_angles + softness, tangent_angles - softness)
+    tangent_angles = np.where(smoothed, tangent_angles, 0.0)
+
+    # Smoothed keys are never the first key so the weight uses the time to the previous key
+    delta_times = np.zeros(num_keys)
+    delta_times[1:] = np.diff(times)
+    tangent_weights = np.where(smoothed, delta_times / np.cos(tangent_angles) * weight_factor, 0.0)
+
+    return TangentSolution(
+        peak_or_valley=peak_or_valley,
+        angle_in=angle_in,
+        angle_out=angle_out,
+        smoothed=smoothed,
+        tangent_angles=tangent_angles,
+        tangent_weights=tangent_weights,
+    )
+
+
+def find_static_curves(curve_values: list, tolerance: float = 0.0) -> np.ndarray:
+    """Flag the curves whose key values all lie within `tolerance` of each other. The values of
+    every curve are checked in one pass over their concatenated keys. Curves without keys are not
+    flagged.
+    """
+    lengths = np.array([len(values) for values in curve_values], dtype=int)
+    static = np.zeros(len(lengths), dtype=bool)
+    keyed = lengths > 0
+    if not keyed.any():
+        return static
+
+    values = np.concatenate([np.asarray(v, dtype=float) for v in curve_values])
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))[keyed]
+    ranges = np.maximum.reduceat(values, starts) - np.minimum.reduceat(values, starts)
+    static[keyed] = ranges <= tolerance
+    return static
+
+
+def reduce_keys(
+    times,
+    values,
+    tolerance: float,
+    time_tolerance: float = 0.0,
+    smoothing_value: float = 0.0,
+    smooth_all_splines: bool = False,
+) -> np.ndarray:
+    """Flag the keys to keep so that the curve refit through the kept keys passes within
+    `tolerance` (in value units) of every removed key, up to `time_tolerance` away from it in time.
+    The tangent settings are those the refit is done with (see `get_refit_slopes`).
+
+    Keys are removed greedily against the refit curve itself. Each pass tries to remove every
+    `REMOVAL_SPACING`th kept key at once and keeps the removal of those whose neighbouring segments
+    stay within tolerance, as removing a key only changes the tangents of the keys around it. The
+    passes repeat until no more keys can be removed. Removals tried together can still affect each
+    other through the peaks and valleys, so the result is checked with `refit_reduced_keys`. The
+    first and last keys are always kept.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    refit = partial(
+        get_refit_errors,
+        times,
+        values,
+        time_tolerance=time_tolerance,
+        smoothing_value=smoothing_value,
+        smooth_all_splines=smooth_all_splines,
+    )
+
+    keep = np.ones(len(times), dtype=bool)
+    removed_any = len(times) > 2
+    while removed_any:
+        removed_any = False
+        for phase in range(REMOVAL_SPACING):
+            candidates = np.flatnonzero(keep)[1:-1][phase::REMOVAL_SPACING]
+            if not candidates.size:
+                continue
+            trial = keep.copy()
+            trial[candidates] = False
+            removed, errors = refit(trial)
+
+            # Largest error in each segment between the kept keys of the trial. A removed key
+            # changes its own segment and the tangents on the kept keys bounding it
+            kept = np.flatnonzero(trial)
+            segment_errors = np.zeros(len(kept) + 1)
+            np.maximum.at(segment_errors, np.searchsorted(kept, removed), errors)
+            segments = np.searchsorted(kept, candidates)
+            worst = np.maximum(
+                np.maximum(segment_errors[segments - 1], segment_errors[segments]),
+                segment_errors[segments + 1],
+            )
+            accepted = candidates[worst <= tolerance]
+            if accepted.size:
+                keep[accepted] = False
+                removed_any = True
+
+    return refit_reduced_keys(
+        times,
+        values,
+        keep,
+        tolerance,
+        time_tolerance=time_tolerance,
+        smoothing_value=smoothing_value,
+        smooth_all_splines=smooth_all_splines,
+    )
+
+
+def refit_reduced_keys(
+    times,
+    values,
+    keep,
+    tolerance: float,
+    time_tolerance: float = 0.0,
+    smoothing_value: float = 0.0,
+    smooth_all_splines: bool = False,
+) -> np.ndarray:
+    """Put removed keys back until the curve refit through the kept keys passes within `tolerance`
+    of every removed key (see `get_refit_errors`).
+
+    Each pass puts back the key with the largest error in every segment (between two kept keys)
+    that still has a key out of tolerance. Returns the new flags of the keys to keep.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    keep = np.array(keep, dtype=bool)
+
+    while True:
+        removed, errors = get_refit_errors(
+            times,
+            values,
+            keep,
+            time_tolerance=time_tolerance,
+            smoothing_value=smoothing_value,
+            smooth_all_splines=smooth_all_splines,
+        )
+        out_of_tolerance = errors > tolerance
+        if not out_of_tolerance.any():
+            break
+
+        # Removed keys are grouped by the segment they are in as they are sorted
+        segments = np.searchsorted(np.flatnonzero(keep), removed)
+        new_segment = np.diff(segments, prepend=-1) != 0
+        segment_ids = np.cumsum(new_segment) - 1
+        errors = np.where(out_of_tolerance, errors, -np.inf)
+        max_errors = np.maximum.reduceat(errors, np.flatnonzero(new_segment))[segment_ids]
+        at_max = np.flatnonzero(out_of_tolerance & (errors == max_errors))
+        first_at_max = at_max[np.diff(segment_ids[at_max], prepend=-1) != 0]
+        keep[removed[first_at_max]] = True
+
+    return keep
+
+
+def get_refit_errors(
+    times,
+    values,
+    keep,
+    time_tolerance: float = 0.0,
+    smoothing_value: float = 0.0,
+    smooth_all_splines: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get the indices of the removed keys and how far the curve refit through the kept keys
+    misses each of them. The refit curve comes within the error of a removed key's value at some
+    time no more than `time_tolerance` away from it. Errors are `0` or less for keys it meets.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    keep = np.asarray(keep, dtype=bool)
+    removed = np.flatnonzero(~keep)
+    if not removed.size:
+        return removed, np.zeros(0)
+
+    kept = np.flatnonzero(keep)
+    slopes = get_refit_slopes(
+        times[kept],
+        values[kept],
+        smoothing_value=smoothing_value,
+        smooth_all_splines=smooth_all_splines,
+    )
+    offsets = np.zeros(1)
+    if time_tolerance > 0:
+        offsets = np.array([-time_tolerance, 0.0, time_tolerance])
+    samples = evaluate_keys(times[kept], values[kept], slopes, times[removed][:, None] + offsets)
+
+    # The curve passes through every value between the samples around a key, so the error is the
+    # distance from the key's value to the range of the samples
+    errors = np.maximum(
+        samples.min(axis=1) - values[removed], values[removed] - samples.max(axis=1)
+    )
+    return removed, errors
+
+
+def get_spline_slopes(times, values) -> np.ndarray:
+    """Get the slope of a spline tangent on every key, that of the line joining the keys either
+    side of it. The first and last keys use the line to their only neighbour.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    num_keys = len(times)
+    if num_keys < 2:
+        return np.zeros(num_keys)
+    prev_keys = np.maximum(np.arange(num_keys) - 1, 0)
+    next_keys = np.minimum(np.arange(num_keys) + 1, num_keys - 1)
+    return (values[next_keys] - values[prev_keys]) / (times[next_keys] - times[prev_keys])
+
+
+def get_refit_slopes(
+    times, values, smoothing_value: float = 0.0, smooth_all_splines: bool = False
+) -> np.ndarray:
+    """Get the slope of the tangent the cleaner fits on every key: flat on peaks and valleys, the
+    solved angle on smoothed keys (see `solve_tangents`) and a spline on all other keys
+    """
+    solution = solve_tangents(
+        times, values, smoothing_value=smoothing_value, smooth_all_splines=smooth_all_splines
+    )
+    slopes = np.where(solution.peak_or_valley, 0.0, get_spline_slopes(times, values))
+    return np.where(solution.smoothed, np.tan(solution.tangent_angles), slopes)
+
+
+def evaluate_keys(times, values, slopes, sample_times) -> np.ndarray:
+    """Evaluate the curve through keys with the given tangent slopes (a cubic Hermite spline) at
+    every sample time. Samples before the first or after the last key take that key's value.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    slopes = np.asarray(slopes, dtype=float)
+    sample_times = np.asarray(sample_times, dtype=float)
+    if len(times) < 2:
+        return np.full(sample_times.shape, values[0] if len(values) else 0.0)
+
+    sample_times = np.clip(sample_times, times[0], times[-1])
+    segments = np.clip(np.searchsorted(times, sample_times, side='right') - 1, 0, len(times) - 2)
+    start_times = times[segments]
+    lengths = times[segments + 1] - start_times
+    s = (sample_times - start_times) / lengths
+    s2 = s * s
+    s3 = s2 * s
+    return (
+        (2 * s3 - 3 * s2 + 1) * values[segments]
+        + (s3 - 2 * s2 + s) * lengths * slopes[segments]
+        + (3 * s2 - 2 * s3) * values[segments + 1]
+        + (s3 - s2) * lengths * slopes[segments + 1]
+    )
+
+
+class CurveKeys(NamedTuple):
+    """The key times and values read from an anim curve
+
+    The keys can be a slice of the curve starting at key `offset`. Only the keys from `edit_start`
+    up to (not including) `edit_stop` may be changed, the keys either side are there so the
+    changed keys are planned the same way they would be with the whole curve.
+    """
+
+    times: np.ndarray
+    values: np.ndarray
+    offset: int = 0
+    edit_start: int = 0
+    edit_stop: Optional[int] = None
+    total_keys: Optional[int] = None
+
+    def get_editable(self) -> np.ndarray:
+        """Flag the keys that may be changed"""
+        editable = np.zeros(len(self.times), dtype=bool)
+        editable[self.edit_start : self.edit_stop] = True
+        return editable
+
+
+class CleanSettings(NamedTuple):
+    """The cleaning operations to plan and their settings"""
+
+    remove_static: bool = False
+    remove_redundant_keys: bool = False
+    reduce_keys: bool = False
+    tolerance: float = 0.01
+    time_tolerance: float = 0.0
+    clean_tangents: bool = True
+    smoothing_value: float = 0.0
+    weight_factor: float = 0.333
+    smooth_all_splines: bool = False
+
+
+class CleanPlan(NamedTuple):
+    """The changes that clean an anim curve
+
+    `redundant` and `reduced` are the indices (into the keys that were planned) of the keys to
+    remove. `tangents` is solved on the keys that remain once they have been removed, or is `None`
+    when the tangents are not cleaned. `edited` flags the remaining keys whose tangents are changed.
+    """
+
+    redundant: np.ndarray
+    reduced: np.ndarray
+    tangents: Optional[TangentSolution]
+    edited: Optional[np.ndarray] = None
+
+
+def plan_clean(keys: CurveKeys, settings: CleanSettings) -> CleanPlan:
+    """Work out the changes that clean an anim curve"""
+    times = np.asarray(keys.times, dtype=float)
+    values = np.asarray(keys.values, dtype=float)
+    editable = keys.get_editable()
+    keep = np.ones(len(times), dtype=bool)
+
+    redundant = np.zeros(0, dtype=int)
+    if settings.remove_redundant_keys:
+        redundant = np.flatnonzero(get_redundant_keys(values) & editable)
+        keep[redundant] = False
+
+    reduced = np.zeros(0, dtype=int)
+    if settings.reduce_keys:
+        # Reduce between the kept keys either side of the editable keys, which are always kept
+        window = keep.copy()
+        window[: max(keys.edit_start - 1, 0)] = False
+        if keys.edit_stop is not None:
+            window[keys.edit_stop + 1 :] = False
+        if np.count_nonzero(window) > 2:
+            remaining = np.flatnonzero(window)
+            kept = reduce_keys(
+                times[window],
+                values[window],
+                settings.tolerance,
+                time_tolerance=settings.time_tolerance,
+                smoothing_value=settings.smoothing_value,
+                smooth_all_splines=settings.smooth_all_splines,
+            )
+            reduced = remaining[~kept]
+            keep[reduced] = False
+
+    tangents = None
+    edited = None
+    if settings.clean_tangents:
+        edited = editable[keep]
+        tangents = solve_tangents(
+            times[keep],
+            values[keep],
+            smoothing_value=settings.smoothing_value,
+            weight_factor=settings.weight_factor,
+            smooth_all_splines=settings.smooth_all_splines,
+        )
+
+    return CleanPlan(redundant=redundant, reduced=reduced, tangents=tangents, edited=edited)
+
+
+def plan_clean_curves(
+    curves: list[CurveKeys], settings: CleanSettings, executor: Executor = None
+) -> list[CleanPlan]:
+    """Plan the clean of many anim curves, spread across a pool of workers
+
+    A thread pool is used unless an executor is given. The plans are returned in the same order as
+    the curves.
+    """
+    plan = partial(plan_clean, settings=settings)
+    if executor is not None:
+        return list(executor.map(plan, curves))
+    if len(curves) < PARALLEL_MIN_CURVES:
+        return [plan(keys) for keys in curves]
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        return list(pool.map(plan, curves))
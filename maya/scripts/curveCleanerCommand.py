@@ -1,20 +1,29 @@
-import math
 from contextlib import contextmanager
+from typing import NamedTuple
 
 import maya.api.OpenMaya as om2
 import maya.api.OpenMayaAnim as oma2
+import numpy as np
 from maya import cmds
 
-from . import util
+from . import cleanCache, curveAnalysis, curveSnapshot, util
+from .undoableCommand import UndoableCommand
 
 
 def tdtCleanCurves(
     tangents=False,
     removeRedundantKeys=False,
+    removeStatic=False,
     splineStartEnd=True,
     smoothness=0.0,
     weightFactor=0.333,
     smoothAllSplines=False,
+    reduceKeys=False,
+    tolerance=0.01,
+    timeTolerance=0.0,
+    time=None,
+    query=False,
+    plan=None,
     **kwargs,
 ):
     """Perform a number of operations to clean up the animation curves associated
@@ -29,6 +38,13 @@ def tdtCleanCurves(
             Indicates that all keys that don't affect the shape of the curve should be removed.
             Defaults to `False`.
 
+        removeStatic|rs (bool, optional):
+            Indicates that curves whose values all lie within the tolerance and whose tangents are
+            all level (so the curve doesn't move between keys) should be deleted, leaving the
+            attribute at the curve's value. Curves on anim layers are kept, and with a time range
+            only curves with all their keys in the range are deleted. In query mode the static
+            curves are reported instead. Defaults to `False`.
+
         splineStartEnd|sse (bool, optional):
             Indicates that the tangent type for the start and end keys should be spline.
             Defaults to `True`.
@@ -43,311 +59,632 @@ def tdtCleanCurves(
             Indicates whether or not to apply the softness value to all spline tangents or just
             those on keys immediately before and after a peak/valley. Defaults to `False`.
 
+        reduceKeys|rdk (bool, optional):
+            Indicates that keys should be removed wherever the curve can be rebuilt from fewer keys
+            within the tolerance. Tangents are re-fit on the remaining keys and the curve through
+            them must pass within the tolerance of every removed key. Defaults to `False`.
+
+        tolerance|tol (float, optional):
+            The largest change in value allowed when reducing keys, and the largest difference
+            between the values of a static curve. Defaults to `0.01`.
+
+        timeTolerance|tt (float, optional):
+            How far in time (in frames) the reduced curve may pass a removed key's value instead of
+            at the key's own time. Defaults to `0.0`.
+
+        time|ti (tuple[float, float], optional):
+            Only clean the keys within this time range (inclusive). The keys either side of the
+            range are used to plan the clean but are left as they are. When not given, the
+            highlighted time slider range is used if there is one, otherwise all keys are cleaned.
+            Defaults to `None`.
+
+        query|q (bool, optional):
+            Plan the clean without changing any curves and return the plan (`CleanCurvesPlan`).
+            When a plan is given as well, the objects it was made for are planned again with the
+            new settings, over the plan's time range unless one is given. The keys it read are
+            reused unless the static curve settings or the time range differ, or curves were
+            left out of it as already cleaned. Defaults to `False`.
+
+        plan|p (CleanCurvesPlan, optional):
+            Apply a plan returned by an earlier query instead of analysing the curves again. The
+            plan is applied with the settings, objects and time range it was made with, the
+            selection, time slider and cleaning flags are ignored. Defaults to `None`.
+
+    Returns:
+        CleanCurvesPlan: The plan in query mode, otherwise `None`.
+
     """
-    CurveCleanerCommand(
+    return CurveCleanerCommand(
         tangents=kwargs.get('t', tangents),
         removeRedundantKeys=kwargs.get('rrk', removeRedundantKeys),
+        removeStatic=kwargs.get('rs', removeStatic),
         splineStartEnd=kwargs.get('sse', splineStartEnd),
         smoothness=kwargs.get('s', smoothness),
         weightFactor=kwargs.get('wf', weightFactor),
         smoothAllSplines=kwargs.get('sas', smoothAllSplines),
+        reduceKeys=kwargs.get('rdk', reduceKeys),
+        tolerance=kwargs.get('tol', tolerance),
+        timeTolerance=kwargs.get('tt', timeTolerance),
+        time=kwargs.get('ti', time),
+        query=kwargs.get('q', query),
+        plan=kwargs.get('p', plan),
     ).run()
 
 
-class CurveCleanerCommand:
-    VALID_ANIMCURVES = ['animCurveTA', 'animCurveTL', 'animCurveTT', 'animCurveTU']
+INTEGER_TYPES = (
+    om2.MFnNumericData.kByte,
+    om2.MFnNumericData.kChar,
+    om2.MFnNumericData.kShort,
+    om2.MFnNumericData.kInt,
+    om2.MFnNumericData.kLong,
+)
+
+# Tangent types that never move a curve between keys with equal values, whatever their angle
+LEVEL_TANGENT_TYPES = (
+    oma2.MFnAnimCurve.kTangentFlat,
+    oma2.MFnAnimCurve.kTangentStep,
+    oma2.MFnAnimCurve.kTangentStepNext,
+    oma2.MFnAnimCurve.kTangentLinear,
+)
+
+# Infinity types that repeat the keyed values before and after the keys
+REPEATING_INFINITY_TYPES = (
+    oma2.MFnAnimCurve.kConstant,
+    oma2.MFnAnimCurve.kCycle,
+    oma2.MFnAnimCurve.kOscillate,
+)
+
+
+class CurvePlan(NamedTuple):
+    """The planned clean of one anim curve, with the keys it was planned from"""
+
+    anim_curve: om2.MObjectHandle
+    keys: curveAnalysis.CurveKeys
+    plan: curveAnalysis.CleanPlan
+    tangent_types: np.ndarray
+
+    @property
+    def removed(self) -> np.ndarray:
+        """Indices of all the keys to remove"""
+        removed = np.concatenate((self.plan.redundant, self.plan.reduced))
+        return np.sort(removed) + self.keys.offset
+
+    @property
+    def num_keys(self) -> int:
+        """Number of keys on the curve when it was planned"""
+        if self.keys.total_keys is None:
+            return len(self.keys.times)
+        return self.keys.total_keys
+
+    def is_current(self) -> bool:
+        """Check the curve still exists and has the keys it was planned from"""
+        if not self.anim_curve.isValid():
+            return False
+        return oma2.MFnAnimCurve(self.anim_curve.object()).numKeys == self.num_keys
+
+
+class CleanCurvesPlan:
+    """The changes tdtCleanCurves will make to a set of anim curves
+
+    Key indices, tangent types, angles and weights are held as arrays on each `CurvePlan`. The
+    tangent arrays index the keys that remain once the removed keys are gone.
+    """
 
-    TANGENT_DICT = {
-        oma2.MFnAnimCurve.kTangentFlat: 'flat',
-        oma2.MFnAnimCurve.kTangentSmooth: 'spline',
-    }
+    def __init__(
+        self,
+        curves: list[CurvePlan],
+        settings: curveAnalysis.CleanSettings,
+        settings_key=None,
+        num_curves_unchanged: int = 0,
+        static_curves: list[om2.MObjectHandle] = None,
+        selected: list[om2.MObjectHandle] = None,
+    ):
+        self.curves = curves
+        # Curves to delete as their values don't change
+        self.static_curves = static_curves or []
+        self.settings = settings
+        # Identifies the settings in the clean cache: the settings, start and end tangent type and
+        # time range the plan was made with
+        self.settings_key = settings_key
+        # The objects the plan was made for
+        self.selected = selected or []
+        # Curves left out of the plan as they were already cleaned with the same settings
+        self.num_curves_unchanged = num_curves_unchanged
+
+    def __len__(self):
+        return len(self.curves)
+
+    @property
+    def time_range(self) -> tuple[float, float]:
+        return self.settings_key[2]
+
+    @property
+    def num_static_curves(self) -> int:
+        return len(self.static_curves)
+
+    @property
+    def num_keys_removed(self) -> int:
+        return sum(len(c.plan.redundant) for c in self.curves)
+
+    @property
+    def num_keys_reduced(self) -> int:
+        return sum(len(c.plan.reduced) for c in self.curves)
+
+    @property
+    def num_curves_cleaned(self) -> int:
+        return sum(c.plan.tangents is not None for c in self.curves)
+
+    def get_counts(self) -> dict[str, dict[str, int]]:
+        """Get the number of removed, reduced and smoothed keys for each curve by name"""
+        counts = {}
+        for curve in self.curves:
+            if not curve.anim_curve.isValid():
+                continue
+            smoothed = 0
+            if curve.plan.tangents is not None:
+                smoothed = int(np.count_nonzero(curve.plan.tangents.smoothed & curve.plan.edited))
+            counts[om2.MFnDependencyNode(curve.anim_curve.object()).name()] = {
+                'removed': len(curve.plan.redundant),
+                'reduced': len(curve.plan.reduced),
+                'smoothed': smoothed,
+            }
+        return counts
+
+    def get_static_curve_names(self) -> list[str]:
+        """Get the names of the static curves"""
+        return [
+            om2.MFnDependencyNode(c.object()).name() for c in self.static_curves if c.isValid()
+        ]
+
+
+class CurveCleanerCommand(UndoableCommand):
+    VALID_ANIMCURVES = ['animCurveTA', 'animCurveTL', 'animCurveTT', 'animCurveTU']
 
     def __init__(
         self,
         tangents=False,
         removeRedundantKeys=False,
+        removeStatic=False,
         splineStartEnd=True,
         smoothness=0.0,
         weightFactor=0.333,
         smoothAllSplines=False,
+        reduceKeys=False,
+        tolerance=0.01,
+        timeTolerance=0.0,
+        time=None,
+        query=False,
+        plan=None,
+        executor=None,
     ):
-        # Default to clean tangents if no cleaning flags provided
-        if not tangents and not removeRedundantKeys:
+        super().__init__()
+
+        # Default to clean tangents if no cleaning flags provided. Reducing keys always re-fits the
+        # tangents on the keys that remain
+        if (not tangents and not removeRedundantKeys and not removeStatic) or reduceKeys:
             tangents = True
 
-        self.clean_tangents = tangents
-        self.remove_redundant_keys = removeRedundantKeys
+        self.settings = curveAnalysis.CleanSettings(
+            remove_static=removeStatic,
+            remove_redundant_keys=removeRedundantKeys,
+            reduce_keys=reduceKeys,
+            tolerance=tolerance,
+            time_tolerance=timeTolerance,
+            clean_tangents=tangents,
+            smoothing_value=smoothness,
+            weight_factor=weightFactor,
+            smooth_all_splines=smoothAllSplines,
+        )
 
         self.start_end_tangent_type = oma2.MFnAnimCurve.kTangentSmooth
         if splineStartEnd is False:
             self.start_end_tangent_type = oma2.MFnAnimCurve.kTangentFlat
 
-        self.smoothing_value = smoothness
-        self.weight_factor = weightFactor
-        self.smooth_all_splines = smoothAllSplines
+        self.query = query
+        self.plan = plan
+
+        # Pool used to plan the curves, a thread pool is created when not given
+        self.executor = executor
 
         self.num_keys_removed = 0
+        self.num_keys_reduced = 0
         self.num_curves_cleaned = 0
+        self.num_curves_skipped = 0
+        self.num_curves_unchanged = 0
+        self.num_static_removed = 0
+
+        # A plan is applied with everything it was made with
+        if plan is not None and not query:
+            self.settings, self.start_end_tangent_type, self.time_range = plan.settings_key
+            self.settings_key = plan.settings_key
+            self.selected = plan.selected
+            return
 
-        self.selected = util.get_selected_objects()
+        self.time_range = time
+        if self.time_range is None:
+            if plan is not None:
+                self.time_range = plan.time_range
+            else:
+                self.time_range = util.get_time_slider_range()
+
+        # Curves cleaned with the same settings (and range) that haven't changed since are skipped
+        self.settings_key = (
+            self.settings,
+            self.start_end_tangent_type,
+            None if self.time_range is None else tuple(self.time_range),
+        )
+
+        if plan is not None:
+            self.selected = plan.selected
+        else:
+            self.selected = util.get_selected_nodes()
 
     def run(self):
-        if not self.selected:
-            cmds.warning('No Objects Selected')
-            return
+        # A given plan is applied as it is, unless it is only being used for its keys
+        if self.plan is not None and not self.query:
+            self.apply(self.plan)
+            return None
+
+        if self.plan is not None and self.can_reuse_keys(self.plan):
+            anim_curves = [c.anim_curve for c in self.plan.curves]
+            snapshots = [c.keys for c in self.plan.curves]
+            static_curves = self.plan.static_curves
+        else:
+            self.selected = [node for node in self.selected if node.isValid()]
+            if not self.selected:
+                cmds.warning('No Objects Selected')
+                return None
+
+            static_curves = []
+            if self.settings.remove_static:
+                static_curves = self.find_static_curves()
+            static_keys = {c.hashCode() for c in static_curves}
+
+            anim_curves = []
+            snapshots = []
+            cache = cleanCache.get_cache()
+            for anim_curve in get_anim_curve_list(self.selected):
+                if anim_curve.hashCode() in static_keys:
+                    continue
+                if cache.is_clean(anim_curve, self.settings_key):
+                    self.num_curves_unchanged += 1
+                    continue
+                keys = read_keys(oma2.MFnAnimCurve(anim_curve.object()), self.time_range)
+                if keys is not None:
+                    anim_curves.append(anim_curve)
+                    snapshots.append(keys)
+
+        plan = self.make_plan(anim_curves, snapshots, static_curves)
+        if self.query:
+            return plan
+
+        self.apply(plan)
+        return None
+
+    def can_reuse_keys(self, plan: CleanCurvesPlan) -> bool:
+        """Check the keys read for a plan can be planned again with the command's settings. They
+        can't when the curves left out of the plan (static, or already cleaned) or the range the
+        keys were read over would be different.
+        """
+        static_settings = (self.settings.remove_static, self.settings.tolerance)
+        plan_static_settings = (plan.settings.remove_static, plan.settings.tolerance)
+        return (
+            static_settings == plan_static_settings
+            and plan.num_curves_unchanged == 0
+            and self.settings_key[2] == plan.time_range
+        )
 
-        # Run commands
-        with util.undo_chunk('tradigiTOOLS-tdtCleanCurves'):
-            if self.remove_redundant_keys:
-                self.remove_redundant_keys_from_selected()
-                if self.num_keys_removed:
-                    om2.MGlobal.displayInfo(f'Result: Removed {self.num_keys_removed} keys')
-
-            if self.clean_tangents:
-                self.clean_tangents_on_selected()
-                if self.num_curves_cleaned:
-                    om2.MGlobal.displayInfo(f'Result: Cleaned {self.num_curves_cleaned} curves')
-
-    def remove_redundant_keys_from_selected(self):
-        """Remove the keys from the provided selection list's animation curves that don't affect
-        the curve shape.
+    def find_static_curves(self) -> list[om2.MObjectHandle]:
+        """Find the curves on the selected objects whose values don't change. The values of all the
+        curves are read first and checked together, only the curves with static values then have
+        their tangents checked. With a time range, curves with keys outside it are left alone.
         """
-        anim_curves = get_anim_curve_list(self.selected)
-        for anim_curve in anim_curves:
-            keytimes = get_key_times(anim_curve)
-            # First and last keys will never be redundant, minimum of 3 keys for a possible key removal
-            if len(keytimes) <= 2:
+        anim_curves = util.get_anim_curves(
+            self.selected, curve_types=self.VALID_ANIMCURVES, layered=False
+        )
+        functions = [oma2.MFnAnimCurve(c.object()) for c in anim_curves]
+        values = [curveSnapshot.get_key_values(fn) for fn in functions]
+        static = curveAnalysis.find_static_curves(values, self.settings.tolerance)
+
+        static_curves = []
+        for i in np.flatnonzero(static).tolist():
+            fn = functions[i]
+            if self.time_range is not None and not is_within_range(fn, *self.time_range):
                 continue
-            keyvalues = get_key_values(anim_curve)
-            removekeys = []
-            for i in range(1, len(keytimes) - 1):
-                prev_val, curr_val, next_val = keyvalues[i - 1 : i + 2]
-                # Add the current key to remove list if it is the same as the previous and next keys
-                if curr_val == prev_val and curr_val == next_val:
-                    removekeys.append(keytimes[i])
-            # Remove all keys from list
-            if removekeys:
-                cmds.cutKey(anim_curve, clear=True, time=[(k,) for k in removekeys])
-                self.num_keys_removed += len(removekeys)
-
-    def clean_tangents_on_selected(self):
-        """Switch the tangents on peaks and valleys to flat, while splining the remaining keys for
-        the anim curves on all selected objects.
-        """
-        anim_curves = get_anim_curve_list(self.selected)
-        for anim_curve in anim_curves:
-            self.clean_tangents_on_anim_curve(anim_curve)
-            self.num_curves_cleaned += 1
+            if is_level(fn):
+                static_curves.append(anim_curves[i])
+        return static_curves
+
+    def make_plan(
+        self,
+        anim_curves: list[om2.MObjectHandle],
+        snapshots: list[curveAnalysis.CurveKeys],
+        static_curves: list[om2.MObjectHandle] = None,
+    ) -> CleanCurvesPlan:
+        """Plan the changes to the anim curves away from Maya"""
+        plans = curveAnalysis.plan_clean_curves(snapshots, self.settings, self.executor)
+        curves = []
+        for anim_curve, keys, plan in zip(anim_curves, snapshots, plans):
+            tangent_types = np.zeros(0, dtype=int)
+            if plan.tangents is not None:
+                # The start and end tangent types only apply to the ends of the whole curve
+                tangent_types = self.get_tangent_types(
+                    plan.tangents.peak_or_valley,
+                    first=keys.offset == 0,
+                    last=keys.total_keys in (None, keys.offset + len(keys.times)),
+                )
+            curves.append(CurvePlan(anim_curve, keys, plan, tangent_types))
+        return CleanCurvesPlan(
+            curves,
+            self.settings,
+            self.settings_key,
+            self.num_curves_unchanged,
+            static_curves,
+            self.selected,
+        )
 
-    def clean_tangents_on_anim_curve(self, anim_curve: str):
-        """Switch the tangents on peaks and valleys to flat, while splining the remaining keys on
-        an anim curve.
+    def apply(self, plan: CleanCurvesPlan):
+        """Apply a plan to the anim curves. Curves whose keys changed since the plan was made are
+        skipped.
         """
-        self.keytimes = get_key_times(anim_curve)
-        keyvalues = get_key_values(anim_curve)
-        num_keys = len(self.keytimes)
-
-        # First and last keys will be handed according to the tangent type flag
-        if num_keys > 0:
-            # Set the first tangent to spline
-            self.update_tangents(
-                anim_curve=anim_curve,
-                index=0,
-                tangent_type=self.start_end_tangent_type,
-                angle_in=om2.MAngle(0),
-                angle_out=om2.MAngle(0),
-                ignore_angle=True,
-                apply_softness=False,
+        static_curves = [c for c in plan.static_curves if c.isValid()]
+        if static_curves:
+            self.run_modifier(delete_static_curves(static_curves))
+            self.num_static_removed = len(static_curves)
+
+        # The clean's own edits don't make the curves dirty, they are marked clean afterwards
+        cache = cleanCache.get_cache()
+        with cache.suspend():
+            for curve in plan.curves:
+                if curve.is_current():
+                    self.record(curve.anim_curve)
+                    self.apply_curve_plan(curve)
+                else:
+                    self.num_curves_skipped += 1
+            changes = self.commit()
+
+        for change in changes:
+            if change.after is not None:
+                cache.mark_clean(change.anim_curve, plan.settings_key, change.after)
+
+        self.num_curves_unchanged = plan.num_curves_unchanged
+
+        if self.num_static_removed:
+            om2.MGlobal.displayInfo(f'Result: Removed {self.num_static_removed} static curves')
+        if self.num_keys_removed:
+            om2.MGlobal.displayInfo(f'Result: Removed {self.num_keys_removed} keys')
+        if self.num_keys_reduced:
+            om2.MGlobal.displayInfo(f'Result: Reduced {self.num_keys_reduced} keys')
+        if self.num_curves_cleaned:
+            om2.MGlobal.displayInfo(f'Result: Cleaned {self.num_curves_cleaned} curves')
+        if self.num_curves_unchanged:
+            om2.MGlobal.displayInfo(
+                f'Result: Skipped {self.num_curves_unchanged} curves unchanged since last clean'
             )
-            prev_inequal_value = keyvalues[0]
-        if num_keys > 1:
-            # Set the last tangent to spline
-            self.update_tangents(
-                anim_curve=anim_curve,
-                index=num_keys - 1,
-                tangent_type=self.start_end_tangent_type,
-                angle_in=om2.MAngle(0),
-                angle_out=om2.MAngle(0),
-                ignore_angle=True,
-                apply_softness=False,
+        if self.num_curves_skipped:
+            cmds.warning(
+                f'Skipped {self.num_curves_skipped} curves changed since they were planned'
             )
 
-        # Make a list that determines whether key is a peak or valley
-        peak_or_valley = [False] * num_keys
-        for i in range(1, num_keys - 1):
-            prev_val, curr_val, next_val = keyvalues[i - 1 : i + 2]
-
-            # Keep track of last inequal values to determine if the key is on a peak or a value
-            if curr_val != prev_val:
-                prev_inequal_value = prev_val
-
-            if curr_val != next_val:
-                next_inequal_val = next_val
-            else:
-                # Find the next inequal value
-                for j in range(i + 2, num_keys):
-                    next_inequal_val = keyvalues[j]
-
-                    # exit the loop when a new inequal value is found
-                    if next_inequal_val != curr_val:
-                        break
-
-            if (curr_val <= prev_inequal_value and curr_val <= next_inequal_val) or (
-                curr_val >= prev_inequal_value and curr_val >= next_inequal_val
-            ):
-                peak_or_valley[i] = True
-
-        # Start on the second key and finish on the second last key
-        for i in range(1, num_keys - 1):
-            prev_val, curr_val, next_val = keyvalues[i - 1 : i + 2]
-            prev_time, curr_time, next_time = self.keytimes[i - 1 : i + 2]
-
-            angle_in = get_angle(
-                value1=prev_val, value2=curr_val, time1=prev_time, time2=curr_time
-            )
-            angle_out = get_angle(
-                value1=curr_val, value2=next_val, time1=curr_time, time2=next_time
-            )
+    def apply_curve_plan(self, curve: CurvePlan):
+        """Remove the redundant and reduced keys from an anim curve, then update the tangents on
+        the keys that remain
+        """
+        anim_curve_fn = oma2.MFnAnimCurve(curve.anim_curve.object())
+        self.remove_keys(anim_curve_fn, curve.removed)
+        self.num_keys_removed += len(curve.plan.redundant)
+        self.num_keys_reduced += len(curve.plan.reduced)
 
-            # If the current key is a valley or a peak, the tangent type will be set to flat
-            if peak_or_valley[i]:
-                self.update_tangents(
-                    anim_curve=anim_curve,
-                    index=i,
-                    tangent_type=oma2.MFnAnimCurve.kTangentFlat,
-                    angle_in=angle_in,
-                    angle_out=angle_out,
-                    ignore_angle=True,
-                    apply_softness=False,
-                )
-            else:
-                # Determine if the smoothing should be applied to the spline.
-                # If not in a smooth all splines mode, only splines next to a peak or valley will be
-                # smoothed
-                apply_softness = (
-                    self.smooth_all_splines or peak_or_valley[i - 1] or peak_or_valley[i + 1]
-                )
-                self.update_tangents(
-                    anim_curve=anim_curve,
-                    index=i,
-                    tangent_type=oma2.MFnAnimCurve.kTangentSmooth,
-                    angle_in=angle_in,
-                    angle_out=angle_out,
-                    ignore_angle=False,
-                    apply_softness=apply_softness,
-                )
+        if curve.plan.tangents is not None:
+            self.update_tangents(anim_curve_fn, curve)
+            self.num_curves_cleaned += 1
 
-    def update_tangents(
-        self,
-        anim_curve: str,
-        index: int,
-        tangent_type: int,
-        angle_in: om2.MAngle,
-        angle_out: om2.MAngle,
-        ignore_angle: bool,
-        apply_softness: bool,
-    ):
-        """Modify the current tangent type and, if necessary, the tangent weight to avoid overshoots"""
-        # Update the tangent type for the key
-        cmds.keyTangent(
-            anim_curve,
-            edit=True,
-            time=(self.keytimes[index],),
-            inTangentType=CurveCleanerCommand.TANGENT_DICT[tangent_type],
-            outTangentType=CurveCleanerCommand.TANGENT_DICT[tangent_type],
+    def remove_keys(self, anim_curve_fn: oma2.MFnAnimCurve, indices):
+        """Remove keys from an anim curve by index"""
+        # Remove from the end of the curve so the remaining indices stay valid
+        for index in sorted(indices, reverse=True):
+            anim_curve_fn.remove(int(index))
+
+    def get_tangent_types(
+        self, peak_or_valley: np.ndarray, first: bool = True, last: bool = True
+    ) -> np.ndarray:
+        """Get the tangent type for each key. Peaks and valleys are flat, the first and last keys
+        are handled according to the tangent type flag and all other keys are spline.
+        """
+        tangent_types = np.where(
+            peak_or_valley, oma2.MFnAnimCurve.kTangentFlat, oma2.MFnAnimCurve.kTangentSmooth
         )
+        if len(tangent_types):
+            if first:
+                tangent_types[0] = self.start_end_tangent_type
+            if last:
+                tangent_types[-1] = self.start_end_tangent_type
+        return tangent_types
+
+    def update_tangents(self, anim_curve_fn: oma2.MFnAnimCurve, curve: CurvePlan):
+        """Set the tangent type for every edited key and, for the smoothed keys, the tangent angle
+        and weight to avoid overshoots
+        """
+        solution = curve.plan.tangents
+        offset = curve.keys.offset
+        edited = np.flatnonzero(curve.plan.edited)
 
-        angle_out_rad = angle_out.asRadians()
-        angle_in_rad = angle_in.asRadians()
+        # Update the tangent type for all keys
+        for index, tangent_type in zip(edited.tolist(), curve.tangent_types[edited].tolist()):
+            anim_curve_fn.setInTangentType(index + offset, tangent_type)
+            anim_curve_fn.setOutTangentType(index + offset, tangent_type)
 
-        # The smallest angle is used to avoid overshoots
-        if abs(angle_out_rad) > abs(angle_in_rad):
-            tangent_angle = angle_in
-        else:
-            tangent_angle = angle_out
-
-        # Adjust angle for smoothing if necessary
-        if not ignore_angle and apply_softness:
-            # Add in the smoothing value (softness)
-            radian_diff = abs(angle_out_rad - angle_in_rad)
-            softness = radian_diff * self.smoothing_value
-
-            # Add or subtract the softness depending on positive or negative slope
-            if angle_in_rad > 0 or (angle_in_rad == 0 and angle_out_rad > 0):
-                # Positive slope
-                tangent_angle = om2.MAngle(tangent_angle.asRadians() + softness)
-            else:
-                # Negative Slope
-                tangent_angle = om2.MAngle(tangent_angle.asRadians() - softness)
-
-            # Unlock tangent and weights
-            with temp_unlock_curve(anim_curve):
-                cmds.keyTangent(
-                    anim_curve,
-                    edit=True,
-                    time=(self.keytimes[index],),
-                    inAngle=tangent_angle.asDegrees(),
-                    outAngle=tangent_angle.asDegrees(),
-                )
+        smoothed = edited[solution.smoothed[edited]].tolist()
+        if not smoothed:
+            return
 
-                # Update the in-tangent weight
-                if index != 0:
-                    this_index = index
-                    other_index = index - 1
-                else:
-                    this_index = index + 1
-                    other_index = index
-                delta_time = self.keytimes[this_index] - self.keytimes[other_index]
-                new_weight = delta_time / math.cos(tangent_angle.asRadians()) * self.weight_factor
-                cmds.keyTangent(
-                    anim_curve,
-                    edit=True,
-                    time=(self.keytimes[index],),
-                    inWeight=new_weight,
-                    outWeight=new_weight,
-                )
+        # Unlock tangent and weights
+        with temp_unlock_keys(anim_curve_fn, [index + offset for index in smoothed]):
+            for index in smoothed:
+                tangent_angle = om2.MAngle(solution.tangent_angles[index])
+                tangent_weight = solution.tangent_weights[index]
+                anim_curve_fn.setTangent(index + offset, tangent_angle, tangent_weight, True)
+                anim_curve_fn.setTangent(index + offset, tangent_angle, tangent_weight, False)
 
 
 # -------------------------------------------------------------------------------------------------
 
 
-def get_anim_curve_list(nodes: list[str]) -> list[str]:
+def get_anim_curve_list(nodes: list[om2.MObjectHandle]) -> list[om2.MObjectHandle]:
     """Get a list of anim curves given a nodes list"""
-    curves = [n for n in cmds.listHistory(nodes) if cmds.objectType(n, isAType='animCurve')] or []
-    # Filter to valid anim curves and convert to set to avoid returning duplicates
-    curves = {c for c in curves if cmds.objectType(c) in CurveCleanerCommand.VALID_ANIMCURVES}
-    return list(curves)
+    return util.get_anim_curves(nodes, curve_types=CurveCleanerCommand.VALID_ANIMCURVES)
 
 
-def get_key_times(anim_curve: str) -> list[float]:
-    """Get a list of key times for a given anim curve"""
-    return cmds.keyframe(anim_curve, query=True) or []
-
+def read_keys(
+    anim_curve_fn: oma2.MFnAnimCurve, time_range: tuple[float, float] = None
+) -> curveAnalysis.CurveKeys:
+    """Read the key times and values of an anim curve for planning. With a time range, only the
+    keys in the range and the keys needed to plan them are read. Returns `None` when there are no
+    keys in the range.
+    """
+    num_keys = anim_curve_fn.numKeys
+    if time_range is None:
+        return curveAnalysis.CurveKeys(
+            times=curveSnapshot.get_key_times(anim_curve_fn),
+            values=curveSnapshot.get_key_values(anim_curve_fn),
+        )
 
-def get_key_values(anim_curve: str) -> list[float]:
-    """Get a list of key values for a given anim curve"""
-    return cmds.keyframe(anim_curve, query=True, valueChange=True) or []
+    start, stop = find_key_range(anim_curve_fn, *time_range)
+    if start == stop:
+        return None
+
+    # The neighbouring keys are needed to plan the keys in the range. Peaks and valleys are found
+    # from the first different value either side of the neighbours, past any flat run of keys
+    first = max(start - 1, 0)
+    while first > 0 and anim_curve_fn.value(first - 1) == anim_curve_fn.value(first):
+        first -= 1
+    first = max(first - 1, 0)
+
+    last = min(stop, num_keys - 1)
+    while last < num_keys - 1 and anim_curve_fn.value(last + 1) == anim_curve_fn.value(last):
+        last += 1
+    last = min(last + 1, num_keys - 1)
+
+    return curveAnalysis.CurveKeys(
+        times=curveSnapshot.get_key_times(anim_curve_fn, first, last + 1),
+        values=curveSnapshot.get_key_values(anim_curve_fn, first, last + 1),
+        offset=first,
+        edit_start=start - first,
+        edit_stop=stop - first,
+        total_keys=num_keys,
+    )
+
+
+def find_key_range(
+    anim_curve_fn: oma2.MFnAnimCurve, start_time: float, end_time: float
+) -> tuple[int, int]:
+    """Find the indices of the first key at or after `start_time` and one past the last key at
+    or before `end_time`, by binary search on the curve
+    """
+    num_keys = anim_curve_fn.numKeys
+    if not num_keys:
+        return 0, 0
+    time_unit = om2.MTime.uiUnit()
+
+    start = anim_curve_fn.findClosest(om2.MTime(start_time, time_unit))
+    if anim_curve_fn.input(start).asUnits(time_unit) < start_time:
+        start += 1
+
+    stop = anim_curve_fn.findClosest(om2.MTime(end_time, time_unit))
+    if anim_curve_fn.input(stop).asUnits(time_unit) <= end_time:
+        stop += 1
+    return start, max(start, stop)
+
+
+def is_within_range(anim_curve_fn: oma2.MFnAnimCurve, start_time: float, end_time: float) -> bool:
+    """Check that all the keys of an anim curve are within a time range (inclusive)"""
+    time_unit = om2.MTime.uiUnit()
+    first = anim_curve_fn.input(0).asUnits(time_unit)
+    last = anim_curve_fn.input(anim_curve_fn.numKeys - 1).asUnits(time_unit)
+    return first >= start_time and last <= end_time
+
+
+def is_level(anim_curve_fn: oma2.MFnAnimCurve) -> bool:
+    """Check that an anim curve with static values doesn't move between or beyond its keys: every
+    tangent is level (a level tangent type, or a tangent with no slope) and the infinity repeats
+    the keyed values. The tangents before the first key and after the last key only matter for a
+    linear infinity.
+    """
+    infinities = (anim_curve_fn.preInfinityType, anim_curve_fn.postInfinityType)
+    if oma2.MFnAnimCurve.kCycleRelative in infinities:
+        return False
+
+    last = anim_curve_fn.numKeys - 1
+    for index in range(last + 1):
+        for in_tangent, infinity, end in ((True, infinities[0], 0), (False, infinities[1], last)):
+            if index == end and infinity in REPEATING_INFINITY_TYPES:
+                continue
+            if in_tangent:
+                tangent_type = anim_curve_fn.inTangentType(index)
+            else:
+                tangent_type = anim_curve_fn.outTangentType(index)
+            if tangent_type in LEVEL_TANGENT_TYPES and index != end:
+                continue
+            if anim_curve_fn.getTangentXY(index, in_tangent)[1] != 0.0:
+                return False
+    return True
 
 
-def get_angle(value1: float, value2: float, time1: float, time2: float) -> om2.MAngle:
-    """Return the angle for two points on a curve"""
-    value_delta = value2 - value1
-    time_delta = time2 - time1
-    radians = math.atan(value_delta / time_delta)
-    return om2.MAngle(radians)
+def delete_static_curves(anim_curves: list[om2.MObjectHandle]) -> om2.MDGModifier:
+    """Create a modifier that deletes anim curves, leaving the attributes they drive at the curve's
+    value
+    """
+    modifier = om2.MDGModifier()
+    for anim_curve in anim_curves:
+        anim_curve_fn = oma2.MFnAnimCurve(anim_curve.object())
+        output = anim_curve_fn.findPlug('output', False)
+        value = anim_curve_fn.value(0)
+        for destination in output.destinations():
+            modifier.disconnect(output, destination)
+            set_plug_value(modifier, destination, value, anim_curve_fn.animCurveType)
+        modifier.deleteNode(anim_curve.object())
+    return modifier
+
+
+def set_plug_value(
+    modifier: om2.MDGModifier, plug: om2.MPlug, value: float, anim_curve_type: int
+):
+    """Set a plug to an anim curve value (in internal units) through a modifier"""
+    if anim_curve_type == oma2.MFnAnimCurve.kAnimCurveTT:
+        modifier.newPlugValueMTime(plug, om2.MTime(value, om2.MTime.kSeconds))
+        return
+
+    attribute = plug.attribute()
+    if attribute.hasFn(om2.MFn.kEnumAttribute):
+        modifier.newPlugValueInt(plug, int(round(value)))
+    elif attribute.hasFn(om2.MFn.kNumericAttribute):
+        numeric_type = om2.MFnNumericAttribute(attribute).numericType()
+        if numeric_type == om2.MFnNumericData.kBoolean:
+            modifier.newPlugValueBool(plug, bool(round(value)))
+        elif numeric_type in INTEGER_TYPES:
+            modifier.newPlugValueInt(plug, int(round(value)))
+        else:
+            modifier.newPlugValueDouble(plug, value)
+    else:
+        modifier.newPlugValueDouble(plug, value)
 
 
 @contextmanager
-def temp_unlock_curve(anim_curve: str):
-    """Context for temporarily unlocking the tangents for the given anim curve"""
-    weighted = cmds.keyTangent(anim_curve, query=True, weightedTangents=True)[0]
-    t_locks = cmds.keyTangent(anim_curve, query=True, lock=True)
-    w_locks = cmds.keyTangent(anim_curve, query=True, weightLock=True)
-    keytimes = get_key_times(anim_curve)
+def temp_unlock_keys(anim_curve_fn: oma2.MFnAnimCurve, indices: list[int]):
+    """Context for temporarily unlocking the tangents and weights on keys of an anim curve. The
+    curve is switched to weighted tangents until the context exits.
+    """
+    weighted = anim_curve_fn.isWeighted
+    t_locks = [anim_curve_fn.tangentsLocked(i) for i in indices]
+    w_locks = [anim_curve_fn.weightsLocked(i) for i in indices]
     try:
-        cmds.keyTangent(anim_curve, edit=True, lock=False, weightLock=False, weightedTangents=True)
+        anim_curve_fn.setIsWeighted(True)
+        for index in indices:
+            anim_curve_fn.setTangentsLocked(index, False)
+            anim_curve_fn.setWeightsLocked(index, False)
         yield
     finally:
-        for t_lock, w_lock, keytime in zip(t_locks, w_locks, keytimes):
-            cmds.keyTangent(anim_curve, edit=True, lock=t_lock, weightLock=w_lock, time=(keytime,))
-        cmds.keyTangent(anim_curve, edit=True, weightedTangents=weighted)
+        for index, t_lock, w_lock in zip(indices, t_locks, w_locks):
+            anim_curve_fn.setTangentsLocked(index, t_lock)
+            anim_curve_fn.setWeightsLocked(index, w_lock)
+        anim_curve_fn.setIsWeighted(weighted)
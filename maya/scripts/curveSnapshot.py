@@ -0,0 +1,189 @@
+"""Read and write the complete key data of anim curves as arrays
+
+A `CurveData` holds everything needed to rebuild the keys of a curve: times, values, tangent
+types, tangents, tangent and weight locks, breakdown flags and whether the curve uses weighted
+tangents. Values and tangents are kept in internal units so a curve can be written back exactly as
+it was read.
+
+`get_key_times` and `get_key_values` read just the times or values in UI units, which is what the
+tools work with.
+"""
+import hashlib
+from typing import NamedTuple
+
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+import numpy as np
+
+# Key times are stored in ticks so they survive a change of the scene's time unit
+TIME_UNIT = om2.MTime.k6000FPS
+
+# `addKeys` only writes these curve types, the others are written a key at a time
+BULK_CURVE_TYPES = (
+    oma2.MFnAnimCurve.kAnimCurveTA,
+    oma2.MFnAnimCurve.kAnimCurveTL,
+    oma2.MFnAnimCurve.kAnimCurveTU,
+)
+
+
+class CurveData(NamedTuple):
+    """The keys of an anim curve, one array entry per key"""
+
+    times: np.ndarray
+    values: np.ndarray
+    in_tangent_types: np.ndarray
+    out_tangent_types: np.ndarray
+    in_tangents: np.ndarray
+    out_tangents: np.ndarray
+    tangents_locked: np.ndarray
+    weights_locked: np.ndarray
+    breakdowns: np.ndarray
+    weighted: bool
+
+    @property
+    def num_keys(self) -> int:
+        return len(self.times)
+
+
+def read_curve(anim_curve_fn: oma2.MFnAnimCurve, start: int = 0) -> CurveData:
+    """Read all the keys of an anim curve, or the keys from index `start` on. In and out tangents
+    are `(x, y)` pairs.
+    """
+    indices = range(start, anim_curve_fn.numKeys)
+    return CurveData(
+        times=np.array([anim_curve_fn.input(i).asUnits(TIME_UNIT) for i in indices], dtype=float),
+        values=np.array([anim_curve_fn.value(i) for i in indices], dtype=float),
+        in_tangent_types=np.array([anim_curve_fn.inTangentType(i) for i in indices], dtype=int),
+        out_tangent_types=np.array([anim_curve_fn.outTangentType(i) for i in indices], dtype=int),
+        in_tangents=np.array(
+            [anim_curve_fn.getTangentXY(i, True) for i in indices], dtype=float
+        ).reshape(-1, 2),
+        out_tangents=np.array(
+            [anim_curve_fn.getTangentXY(i, False) for i in indices], dtype=float
+        ).reshape(-1, 2),
+        tangents_locked=np.array([anim_curve_fn.tangentsLocked(i) for i in indices], dtype=bool),
+        weights_locked=np.array([anim_curve_fn.weightsLocked(i) for i in indices], dtype=bool),
+        breakdowns=np.array([anim_curve_fn.isBreakdown(i) for i in indices], dtype=bool),
+        weighted=anim_curve_fn.isWeighted,
+    )
+
+
+def fingerprint(data: CurveData) -> bytes:
+    """Hash all the key data of a curve, to tell whether it changed"""
+    digest = hashlib.blake2b(digest_size=16)
+    for field in data:
+        digest.update(np.ascontiguousarray(field).tobytes())
+    return digest.digest()
+
+
+def get_key_times(
+    anim_curve_fn: oma2.MFnAnimCurve, start: int = 0, stop: int = None
+) -> np.ndarray:
+    """Get the key times of an anim curve in the current time unit"""
+    if stop is None:
+        stop = anim_curve_fn.numKeys
+    time_unit = om2.MTime.uiUnit()
+    return np.array(
+        [anim_curve_fn.input(i).asUnits(time_unit) for i in range(start, stop)], dtype=float
+    )
+
+
+def get_key_values(
+    anim_curve_fn: oma2.MFnAnimCurve, start: int = 0, stop: int = None
+) -> np.ndarray:
+    """Get the key values of an anim curve in the current UI units (the units shown in the graph
+    editor), so tangent angles match the curve as it is displayed
+    """
+    if stop is None:
+        stop = anim_curve_fn.numKeys
+    values = np.array([anim_curve_fn.value(i) for i in range(start, stop)], dtype=float)
+    return values * get_value_scale(anim_curve_fn.animCurveType)
+
+
+def get_value_scale(anim_curve_type: int) -> float:
+    """Get the factor converting the internal key values of a curve type to UI units"""
+    if anim_curve_type in (oma2.MFnAnimCurve.kAnimCurveTA, oma2.MFnAnimCurve.kAnimCurveUA):
+        return om2.MAngle(1.0).asUnits(om2.MAngle.uiUnit())
+    if anim_curve_type in (oma2.MFnAnimCurve.kAnimCurveTL, oma2.MFnAnimCurve.kAnimCurveUL):
+        return om2.MDistance(1.0).asUnits(om2.MDistance.uiUnit())
+    if anim_curve_type in (oma2.MFnAnimCurve.kAnimCurveTT, oma2.MFnAnimCurve.kAnimCurveUT):
+        # Time values are stored in seconds
+        return om2.MTime(1.0, om2.MTime.kSeconds).asUnits(om2.MTime.uiUnit())
+    return 1.0
+
+
+def write_curve(anim_curve_fn: oma2.MFnAnimCurve, data: CurveData, start: int = 0):
+    """Replace all the keys of an anim curve with the keys in `data`, or only the keys from index
+    `start` on. The keys in `data` must all come after the keys before `start`.
+    """
+    set_keys(anim_curve_fn, data.times, data.values, start)
+    anim_curve_fn.setIsWeighted(data.weighted)
+    indices = range(start, start + data.num_keys)
+
+    # Tangents are set while unlocked so setting one side doesn't move the other
+    for index in indices:
+        anim_curve_fn.setTangentsLocked(index, False)
+        anim_curve_fn.setWeightsLocked(index, False)
+
+    # Setting a tangent makes it fixed, so the tangent types are set afterwards. Fixed tangents keep
+    # the exact tangent, the other types work theirs out again from the keys
+    for index, (in_x, in_y) in zip(indices, data.in_tangents.tolist()):
+        anim_curve_fn.setTangent(index, in_x, in_y, True, None, False)
+    for index, (out_x, out_y) in zip(indices, data.out_tangents.tolist()):
+        anim_curve_fn.setTangent(index, out_x, out_y, False, None, False)
+    for index, in_type, out_type in zip(
+        indices, data.in_tangent_types.tolist(), data.out_tangent_types.tolist()
+    ):
+        anim_curve_fn.setInTangentType(index, in_type)
+        anim_curve_fn.setOutTangentType(index, out_type)
+
+    for index, tangents_locked, weights_locked in zip(
+        indices, data.tangents_locked.tolist(), data.weights_locked.tolist()
+    ):
+        anim_curve_fn.setTangentsLocked(index, tangents_locked)
+        anim_curve_fn.setWeightsLocked(index, weights_locked)
+    for index in np.flatnonzero(data.breakdowns).tolist():
+        anim_curve_fn.setIsBreakdown(start + index, True)
+
+
+def set_keys(
+    anim_curve_fn: oma2.MFnAnimCurve, times: np.ndarray, values: np.ndarray, start: int = 0
+):
+    """Replace all the keys of an anim curve, or the keys from index `start` on, with keys at
+    `times` (in ticks) with `values`. The keys get the default tangents.
+    """
+    bulk = len(times) > 0 and anim_curve_fn.animCurveType in BULK_CURVE_TYPES
+    mtimes = om2.MTimeArray([om2.MTime(t, TIME_UNIT) for t in times.tolist()])
+    if bulk and start == 0:
+        anim_curve_fn.addKeys(mtimes, om2.MDoubleArray(values.tolist()), keepExistingKeys=False)
+        return
+
+    # Without keys to add, `addKeys` leaves the existing keys where they are. The keys before
+    # `start` are kept and the new keys merged in after them
+    for index in reversed(range(start, anim_curve_fn.numKeys)):
+        anim_curve_fn.remove(index)
+    if bulk:
+        anim_curve_fn.addKeys(mtimes, om2.MDoubleArray(values.tolist()), keepExistingKeys=True)
+        return
+    for time, value in zip(mtimes, values.tolist()):
+        anim_curve_fn.addKey(time, value)
+
+
+def find_next_key(anim_curve_fn: oma2.MFnAnimCurve, time: float, inclusive: bool = True) -> int:
+    """Find the index of the first key at (when `inclusive`) or after a time in the current time
+    unit, by binary search on the curve. `numKeys` is returned when there is no such key.
+    """
+    num_keys = anim_curve_fn.numKeys
+    if not num_keys:
+        return 0
+    time_unit = om2.MTime.uiUnit()
+    index = anim_curve_fn.findClosest(om2.MTime(time, time_unit))
+    key_time = anim_curve_fn.input(index).asUnits(time_unit)
+    if key_time < time or (key_time == time and not inclusive):
+        index += 1
+    return index
+
+
+def get_ui_time_scale() -> float:
+    """Get the factor converting stored key times (ticks) to the current time unit"""
+    return om2.MTime(1.0, TIME_UNIT).asUnits(om2.MTime.uiUnit())
@@ -1,4 +1,57 @@
+import os
+from typing import Optional
+
+import maya.api.OpenMaya as om2
+from maya import mel
+
+FILE_TYPES = {'.ma': 'mayaAscii', '.mb': 'mayaBinary'}
+
+
 def tdtIncrementalSave():
-    """Incrementally save the current file"""
-    # TODO
-    raise NotImplementedError
+    """Incrementally save the current file, e.g. `shot.ma` is saved as `shot.000.ma` and
+    `shot.003.ma` as `shot.004.ma`. An untitled scene opens the Save As dialog.
+
+    Returns:
+        str: The path the file was saved to.
+
+    """
+    path = om2.MFileIO.currentFile()
+    if os.path.splitext(os.path.basename(path))[0] == 'untitled':
+        mel.eval('SaveSceneAs')
+        return None
+
+    if os.path.splitext(path)[1].lower() not in FILE_TYPES:
+        om2.MGlobal.displayError('Invalid file type (not .ma or .mb)')
+        return None
+
+    new_path = save_incremented()
+    om2.MGlobal.displayInfo(f'Result: {new_path}')
+    return new_path
+
+
+def save_incremented(path: Optional[str] = None) -> str:
+    """Save the scene under the incremented name of `path` (the current file by default). Names
+    already taken on disk are skipped, an existing file is never overwritten.
+    """
+    if path is None:
+        path = om2.MFileIO.currentFile()
+    new_path = get_incremented_path(path)
+    while os.path.exists(new_path):
+        new_path = get_incremented_path(new_path)
+    file_type = FILE_TYPES[os.path.splitext(new_path)[1].lower()]
+    om2.MFileIO.saveAs(new_path, file_type, False)
+    return new_path
+
+
+def get_incremented_path(path: str) -> str:
+    """Get the next version of a file name. The number before the extension is incremented keeping
+    its padding, or `.000` is added when there isn't one.
+    """
+    root, ext = os.path.splitext(path)
+    base, separator, increment = root.rpartition('.')
+    if separator and increment.isdigit():
+        increment = str(int(increment) + 1).zfill(len(increment))
+        root = base
+    else:
+        increment = '000'
+    return f'{root}.{increment}{ext}'
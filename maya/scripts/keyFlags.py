@@ -0,0 +1,129 @@
+"""Tick draw special and breakdown state of many keys at once
+
+Commands mark the keys they set on every affected curve in a single pass. The keys are held as a
+curve id and key index per key and the flags as boolean arrays, one column per flag, so the state
+before the command (for undo) costs a few bytes per key instead of a DG modifier edit.
+"""
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+import numpy as np
+
+TICK_DRAW_SPECIAL = 'tickDrawSpecial'
+BREAKDOWN = 'breakdown'
+FLAGS = (TICK_DRAW_SPECIAL, BREAKDOWN)
+
+
+class KeyFlagChange:
+    """Sets flags on keys across many curves
+
+    `flags` maps the flags to set (see `FLAGS`) to their new value. Call `doIt` to read the
+    current state of the keys and set the flags.
+    """
+
+    def __init__(
+        self,
+        anim_curves: list[om2.MObjectHandle],
+        curve_ids: np.ndarray,
+        indices: np.ndarray,
+        flags: dict[str, bool],
+    ):
+        unknown = set(flags) - set(FLAGS)
+        if unknown:
+            raise ValueError(f"Unknown key flags: {', '.join(sorted(unknown))}")
+
+        # Sorted by curve so each curve is visited once
+        curve_ids = np.asarray(curve_ids, dtype=int)
+        indices = np.asarray(indices, dtype=int)
+        order = np.lexsort((indices, curve_ids))
+        self.anim_curves = anim_curves
+        self.curve_ids = curve_ids[order]
+        self.indices = indices[order]
+        self.flags = list(flags)
+        self.after = np.tile(np.array(list(flags.values()), dtype=bool), (len(order), 1))
+        self.before = None
+
+    def __len__(self):
+        return len(self.indices)
+
+    def doIt(self):
+        self.before = self.read()
+        self.write(self.after)
+
+    def undoIt(self):
+        self.write(self.before)
+
+    def redoIt(self):
+        self.write(self.after)
+
+    def read(self) -> np.ndarray:
+        """Read the flags of the keys, one row per key"""
+        values = np.zeros((len(self.indices), len(self.flags)), dtype=bool)
+        for fn, rows in self.get_curves():
+            for column, flag in enumerate(self.flags):
+                if flag == BREAKDOWN:
+                    values[rows, column] = [fn.isBreakdown(i) for i in self.indices[rows].tolist()]
+                else:
+                    plug_array = fn.findPlug('keyTickDrawSpecial', False)
+                    values[rows, column] = [
+                        plug_array.elementByLogicalIndex(i).asBool()
+                        for i in self.indices[rows].tolist()
+                    ]
+        return values
+
+    def write(self, values: np.ndarray):
+        for fn, rows in self.get_curves():
+            for column, flag in enumerate(self.flags):
+                curve_values = zip(self.indices[rows].tolist(), values[rows, column].tolist())
+                if flag == BREAKDOWN:
+                    for index, value in curve_values:
+                        fn.setIsBreakdown(index, value)
+                else:
+                    plug_array = fn.findPlug('keyTickDrawSpecial', False)
+                    for index, value in curve_values:
+                        plug_array.elementByLogicalIndex(index).setBool(value)
+
+    def get_curves(self):
+        """Yield the function set of every curve that still exists with the rows of its keys"""
+        bounds = np.flatnonzero(np.diff(self.curve_ids)) + 1
+        for rows in np.split(np.arange(len(self.curve_ids)), bounds):
+            if not len(rows):
+                continue
+            anim_curve = self.anim_curves[self.curve_ids[rows[0]]]
+            if anim_curve.isValid():
+                yield oma2.MFnAnimCurve(anim_curve.object()), rows
+
+
+def set_flags(
+    anim_curves: list[om2.MObjectHandle], indices: np.ndarray, flags: dict[str, bool]
+) -> KeyFlagChange:
+    """Set flags on keys of many curves and return the change, to add to the command's changes.
+    `indices` holds the key index on each curve, or a row of indices per curve, `-1` for no key.
+    """
+    indices = np.asarray(indices, dtype=int)
+    if indices.ndim == 1:
+        indices = indices[:, None]
+    curve_ids = np.broadcast_to(np.arange(len(anim_curves))[:, None], indices.shape)
+    keys = indices >= 0
+    change = KeyFlagChange(anim_curves, curve_ids[keys], indices[keys], flags)
+    change.doIt()
+    return change
+
+
+def set_flags_at(
+    anim_curves: list[om2.MObjectHandle], time: float, flags: dict[str, bool]
+) -> KeyFlagChange:
+    """Set flags on the keys at a time (in the current time unit) of many curves"""
+    return set_flags(anim_curves, find_keys(anim_curves, time), flags)
+
+
+def find_keys(anim_curves: list[om2.MObjectHandle], time: float) -> np.ndarray:
+    """Find the index of the key at a time (in the current time unit) on every curve, `-1` where
+    there is none
+    """
+    mtime = om2.MTime(time, om2.MTime.uiUnit())
+    indices = np.full(len(anim_curves), -1, dtype=int)
+    for i, anim_curve in enumerate(anim_curves):
+        index = oma2.MFnAnimCurve(anim_curve.object()).find(mtime)
+        if index is not None:
+            indices[i] = index
+    return indices
@@ -0,0 +1,82 @@
+"""Array based timeline of the keys on many animation curves
+
+Nothing in this module talks to Maya. The key times of every curve are held in one array, along
+with the sorted distinct times of all the keys (the union timeline). Each key knows its position on
+the union timeline, so a change worked out once for the union times applies to every curve with a
+single indexing operation.
+"""
+import numpy as np
+
+
+class KeyTimeline:
+    """The key times of a set of curves
+
+    `times` holds the key times of every curve one after the other, the keys of curve `i` being
+    `times[offsets[i]:offsets[i + 1]]`. `union` holds the distinct key times of all the curves in
+    order, and `union_indices` the position of each key on it.
+    """
+
+    def __init__(self, curve_times: list):
+        lengths = [len(times) for times in curve_times]
+        self.offsets = np.concatenate(([0], np.cumsum(lengths))).astype(int)
+        if curve_times:
+            self.times = np.concatenate([np.asarray(t, dtype=float) for t in curve_times])
+        else:
+            self.times = np.zeros(0)
+        self.union = np.unique(self.times)
+        self.union_indices = np.searchsorted(self.union, self.times)
+
+    def __len__(self):
+        return len(self.union)
+
+    @property
+    def num_curves(self) -> int:
+        return len(self.offsets) - 1
+
+    def get_curve_slice(self, curve_index: int) -> slice:
+        return slice(self.offsets[curve_index], self.offsets[curve_index + 1])
+
+    def find_strip(self, start_time: float, end_time: float) -> tuple[int, int]:
+        """Find the union keys bounding a time range: the last key at or before `start_time` and
+        the first key at or after `end_time`. Keys at the ends of the timeline are used when there
+        is no key before or after the range.
+        """
+        if not len(self.union):
+            return 0, 0
+        last_index = len(self.union) - 1
+        first = np.searchsorted(self.union, start_time, side='right') - 1
+        last = np.searchsorted(self.union, end_time, side='left')
+        return int(np.clip(first, 0, last_index)), int(np.clip(last, 0, last_index))
+
+    def retime(self, first: int, last: int, delta: float, relative: bool = False) -> np.ndarray:
+        """Get the new union times when the keys between `first` and `last` are retimed (see
+        `retime_strip`)
+        """
+        return retime_strip(self.union, first, last, delta, relative)
+
+    def map_times(self, new_union: np.ndarray) -> np.ndarray:
+        """Get the new time of every key from new union times"""
+        return np.asarray(new_union)[self.union_indices]
+
+
+def retime_strip(
+    union: np.ndarray, first: int, last: int, delta: float, relative: bool = False
+) -> np.ndarray:
+    """Retime the keys after `first` up to `last`, shifting all later keys by the change to the
+    last key
+
+    In absolute mode every key in the strip is `delta` frames after the previous one. In relative
+    mode `delta` is added to each gap between keys, though keys never get closer than one frame.
+    """
+    union = np.asarray(union, dtype=float)
+    new_union = union.copy()
+    if first >= last:
+        return new_union
+
+    if relative:
+        steps = np.maximum(np.diff(union[first : last + 1]) + delta, 1.0)
+    else:
+        steps = np.full(last - first, float(delta))
+    new_union[first + 1 : last + 1] = union[first] + np.cumsum(steps)
+    new_union[last + 1 :] += new_union[last] - union[last]
+    return new_union
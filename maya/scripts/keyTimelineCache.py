@@ -0,0 +1,102 @@
+"""Key timeline of the current selection, kept between commands
+
+Building the timeline means resolving the selection and reading the key times of every curve, so
+it is kept until the selection changes, an anim curve is edited or connected, or the time unit
+changes. Queries run on every frame change (like the dock's timing display) then only cost a
+binary search.
+
+The cache only serves queries. Commands that edit keys resolve the selection and read the keys
+again, and invalidate the cache once they are done or undone (see `invalidate`), as not every
+change (e.g. of the current character set) has a callback.
+"""
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+
+from . import curveSnapshot, keyTimeline, util
+
+VALID_ANIMCURVES = ['animCurveTA', 'animCurveTL', 'animCurveTT', 'animCurveTU']
+
+
+class KeyTimelineCache:
+    def __init__(self):
+        self.selected = None
+        self.anim_curves = None
+        self.timeline = None
+        self.callback_ids = []
+
+    def install_callbacks(self):
+        """Start listening for changes that invalidate the timeline"""
+        if self.callback_ids:
+            return
+        self.callback_ids = [
+            om2.MEventMessage.addEventCallback('SelectionChanged', self._on_changed),
+            om2.MEventMessage.addEventCallback('timeUnitChanged', self._on_changed),
+            oma2.MAnimMessage.addAnimCurveEditedCallback(self._on_curves_edited),
+            om2.MDGMessage.addConnectionCallback(self._on_connection),
+        ]
+
+    def remove_callbacks(self):
+        if self.callback_ids:
+            om2.MMessage.removeCallbacks(self.callback_ids)
+        self.callback_ids = []
+
+    def invalidate(self):
+        self.selected = None
+        self.anim_curves = None
+        self.timeline = None
+
+    def get_selected(self) -> list[om2.MObjectHandle]:
+        """Get the selected nodes (see `util.get_selected_nodes`)"""
+        if self.selected is None:
+            self.selected = util.get_selected_nodes()
+        return self.selected
+
+    def get_anim_curves(self) -> list[om2.MObjectHandle]:
+        """Get the anim curves of the selected nodes"""
+        if self.anim_curves is None:
+            self.anim_curves = util.get_anim_curves(
+                self.get_selected(), curve_types=VALID_ANIMCURVES
+            )
+        return self.anim_curves
+
+    def get_timeline(self) -> tuple[list[om2.MObjectHandle], keyTimeline.KeyTimeline]:
+        """Get the anim curves of the selected nodes and their key timeline"""
+        anim_curves = self.get_anim_curves()
+        if self.timeline is None:
+            self.timeline = keyTimeline.KeyTimeline(
+                [curveSnapshot.get_key_times(oma2.MFnAnimCurve(c.object())) for c in anim_curves]
+            )
+        return anim_curves, self.timeline
+
+    def _on_changed(self, client_data):
+        self.invalidate()
+
+    def _on_curves_edited(self, edited_curves, client_data):
+        self.invalidate()
+
+    def _on_connection(self, src_plug, dst_plug, made, client_data):
+        if src_plug.node().hasFn(om2.MFn.kAnimCurve):
+            self.invalidate()
+
+
+# The cache created before this module was reloaded still has callbacks registered
+if globals().get('_cache') is not None:
+    _cache.remove_callbacks()
+_cache = None
+
+
+def get_cache() -> KeyTimelineCache:
+    """Get the key timeline cache shared by all commands"""
+    global _cache
+    if _cache is None:
+        _cache = KeyTimelineCache()
+        _cache.install_callbacks()
+    return _cache
+
+
+def invalidate():
+    """Drop the cached timeline, when keys have been edited. Nothing is done when the cache hasn't
+    been used yet.
+    """
+    if _cache is not None:
+        _cache.invalidate()
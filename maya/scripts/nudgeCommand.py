@@ -0,0 +1,133 @@
+from typing import NamedTuple, Optional
+
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+import numpy as np
+
+from . import curveSnapshot, keyTimeline
+from .retimingCommand import PlayheadChange, RetimingCommand, set_current_time
+
+
+def tdtNudgeTime(delta=1, nextKeyOnComplete=False, **kwargs):
+    """Nudge the key interval at the current frame, moving every later key with it
+
+    Args:
+        delta|d (int, optional):
+            The number of frames to add to the interval. Negative values shorten it, though the
+            keys never get closer than one frame. Defaults to `1`.
+
+        nextKeyOnComplete|nkc (bool, optional):
+            Determines where the playhead will be placed after nudging. If this is true, it is
+            moved to the key at the end of the interval, if false, it will move to the key at its
+            start. Defaults to `False`.
+
+    Returns:
+        int: The number of keys nudged.
+
+    """
+    return NudgeCommand(
+        delta=kwargs.get('d', delta),
+        nextKeyOnComplete=kwargs.get('nkc', nextKeyOnComplete),
+    ).run()
+
+
+class NudgeInterval(NamedTuple):
+    """The keys bounding the interval at the current frame, across all the curves
+
+    `splits` holds the index of the first key to move on each curve (`numKeys` when none move)
+    and `num_keys` the number of keys at the end of the interval.
+    """
+
+    start: float
+    end: float
+    splits: list[int]
+    num_keys: int = 0
+
+
+class NudgeCommand(RetimingCommand):
+    def __init__(self, delta=1, nextKeyOnComplete=False):
+        super().__init__(relative=True, delta=delta, nextKeyOnComplete=nextKeyOnComplete)
+
+    def get_range(self) -> tuple[float, float]:
+        """The interval at the current frame is nudged, whatever range is highlighted"""
+        return self.orig_playhead_time, self.orig_playhead_time + 1
+
+    def edit(self, anim_curves: list[om2.MObjectHandle]) -> Optional[int]:
+        """Shift the keys of every curve from the end of the interval on. The keys around the
+        interval are found on each curve by binary search, so only the keys that move are read and
+        written.
+        """
+        anim_curves = [c for c in anim_curves if oma2.MFnAnimCurve(c.object()).numKeys]
+        functions = [oma2.MFnAnimCurve(c.object()) for c in anim_curves]
+        if not functions:
+            om2.MGlobal.displayError('No Keys Set')
+            return None
+
+        interval = self.find_interval(functions)
+        if interval is None:
+            # Sub-frame keys inside the interval are spaced individually
+            return super().edit(anim_curves)
+        if interval.start >= interval.end:
+            return self.num_retimed
+        self.num_retimed = interval.num_keys
+
+        end_times = keyTimeline.retime_strip(
+            np.array([interval.start, interval.end]), 0, 1, self.timing_delta, relative=True
+        )
+        shift = float(end_times[1]) - interval.end
+        if shift:
+            shift_ticks = shift / curveSnapshot.get_ui_time_scale()
+            for anim_curve, fn, split in zip(anim_curves, functions, interval.splits):
+                if split < fn.numKeys:
+                    self.shift_keys(anim_curve, split, shift_ticks)
+
+        self.new_playhead_time = interval.start
+        if self.next_key_on_complete:
+            self.new_playhead_time = interval.end + shift
+        set_current_time(self.new_playhead_time)
+        self.add_change(PlayheadChange(self.orig_playhead_time, self.new_playhead_time))
+
+        self.commit()
+        return self.num_retimed
+
+    def find_interval(self, functions: list[oma2.MFnAnimCurve]) -> Optional[NudgeInterval]:
+        """Find the latest key at or before the current frame and the earliest key from the next
+        frame on across the curves (see `KeyTimeline.find_strip`), and the first key to move on
+        each curve. Returns `None` when a curve has a key inside the interval.
+        """
+        time_unit = om2.MTime.uiUnit()
+        current_time = self.orig_playhead_time
+
+        prev_times = []
+        next_times = []
+        for fn in functions:
+            after_current = curveSnapshot.find_next_key(fn, current_time, inclusive=False)
+            if after_current > 0:
+                prev_times.append(fn.input(after_current - 1).asUnits(time_unit))
+            next_key = curveSnapshot.find_next_key(fn, current_time + 1)
+            if next_key < fn.numKeys:
+                next_times.append(fn.input(next_key).asUnits(time_unit))
+
+        # The ends of the animation are used when there is no key before or after the interval
+        if prev_times:
+            start = max(prev_times)
+        else:
+            start = min(fn.input(0).asUnits(time_unit) for fn in functions)
+        if next_times:
+            end = min(next_times)
+        else:
+            end = max(fn.input(fn.numKeys - 1).asUnits(time_unit) for fn in functions)
+        if start >= end:
+            return NudgeInterval(start, end, [])
+
+        splits = []
+        num_keys = 0
+        for fn in functions:
+            split = curveSnapshot.find_next_key(fn, start, inclusive=False)
+            if split < fn.numKeys:
+                split_time = fn.input(split).asUnits(time_unit)
+                if split_time < end:
+                    return None
+                num_keys += int(split_time == end)
+            splits.append(split)
+        return NudgeInterval(start, end, splits, num_keys)
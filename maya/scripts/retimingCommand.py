@@ -1,9 +1,19 @@
+from typing import NamedTuple, Optional
+
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+import numpy as np
 from maya import cmds
 
+from . import curveSnapshot, keyTimeline, keyTimelineCache, util
+from .undoableCommand import UndoableCommand
+
 
 def tdtRetiming(
     relative=False,
     delta=1,
+    spacing=None,
+    time=None,
     nextKeyOnComplete=False,
     query=False,
     **kwargs,
@@ -19,6 +29,16 @@ def tdtRetiming(
             The change to the current timing between keys Abs/Rel determined by the relative flag.
             Defaults to `1`.
 
+        spacing|sp (int, optional):
+            Put every key in the time range on this many frames, e.g. `2` to put a blocking pass
+            on twos. All keys in the range are spaced at once and the later keys are shifted by
+            the total change. Overrides the delta and relative flags. Defaults to `None`.
+
+        time|ti (tuple[float, float], optional):
+            The time range to retime. When not given, the highlighted time slider range is used
+            if there is one, otherwise the keys either side of the current frame. Defaults to
+            `None`.
+
         nextKeyOnComplete|nkc (bool, optional):
             Determines where the playhead will be placed after retiming. If this is true, it is
             moved to the last key in the current retiming strip, if false, it will move to the
@@ -27,29 +47,234 @@ def tdtRetiming(
         query|q (bool, optional):
             Indicates if the command is in query mode. Defaults to `False`.
 
+    Returns:
+        RetimingStrip|int: The retiming strip at the current frame in query mode, otherwise the
+        number of keys retimed.
+
     """
-    RetimingCommand(
+    return RetimingCommand(
         relative=kwargs.get('rel', relative),
         delta=kwargs.get('d', delta),
+        spacing=kwargs.get('sp', spacing),
+        time=kwargs.get('ti', time),
         nextKeyOnComplete=kwargs.get('nkc', nextKeyOnComplete),
         query=kwargs.get('q', query),
     ).run()
 
 
-class RetimingCommand:
-    def __init__(self, relative=False, delta=1, nextKeyOnComplete=False, query=False):
+class RetimingStrip(NamedTuple):
+    """The key at or before the current frame and the number of frames to the next key
+
+    `key` is `None` before the first key and `timing` is `None` after the last key. `text` is the
+    strip as it is displayed, e.g. `12 on 4`.
+    """
+
+    key: Optional[float]
+    timing: Optional[float]
+    text: str
+
+
+NO_KEYS_STRIP = RetimingStrip(None, None, 'No Keys Set')
+
+
+class PlayheadChange:
+    """Moves the playhead when the retiming is undone and redone"""
+
+    def __init__(self, orig_time: float, new_time: float):
+        self.orig_time = orig_time
+        self.new_time = new_time
+
+    def undoIt(self):
+        set_current_time(self.orig_time)
+
+    def redoIt(self):
+        set_current_time(self.new_time)
+
+
+class RetimingCommand(UndoableCommand):
+    VALID_ANIMCURVES = keyTimelineCache.VALID_ANIMCURVES
+
+    def __init__(
+        self,
+        relative=False,
+        delta=1,
+        spacing=None,
+        time=None,
+        nextKeyOnComplete=False,
+        query=False,
+    ):
+        super().__init__()
+
         self.relative_mode = relative
         self.timing_delta = delta
+        # Spacing keys evenly is an absolute retime of every key in the range
+        if spacing is not None:
+            self.relative_mode = False
+            self.timing_delta = spacing
+        self.time_range = time
         self.next_key_on_complete = nextKeyOnComplete
         self.query_mode = query
 
         self.num_retimed = 0
         self.orig_playhead_time = cmds.currentTime(query=True)
         self.new_playhead_time = self.orig_playhead_time
-        self.strip_string = 'No Keys Set'
+        self.strip_string = NO_KEYS_STRIP.text
 
-        # TODO ?
+        # Queries (the dock's timing display) are served from the cached selection and keys.
+        # Edits resolve the selection again so they never work on stale keys
+        self.timeline_cache = keyTimelineCache.get_cache()
+        if self.query_mode:
+            self.selected = self.timeline_cache.get_selected()
+        else:
+            self.selected = util.get_selected_nodes()
 
     def run(self):
-        # TODO
-        raise NotImplementedError
+        if not self.query_mode and not self.relative_mode and self.timing_delta < 1:
+            om2.MGlobal.displayError('Absolute retiming values must be greater than 0')
+            return None
+
+        if not self.selected:
+            if self.query_mode:
+                return NO_KEYS_STRIP
+            cmds.warning('No Objects Selected')
+            return None
+
+        if self.query_mode:
+            anim_curves, timeline = self.timeline_cache.get_timeline()
+            if not len(timeline):
+                return NO_KEYS_STRIP
+            strip = self.get_strip(timeline)
+            self.strip_string = strip.text
+            return strip
+
+        anim_curves = util.get_anim_curves(self.selected, curve_types=self.VALID_ANIMCURVES)
+        if self.edit(anim_curves) is None:
+            return None
+
+        om2.MGlobal.displayInfo(f'Result: {self.num_retimed}')
+        return self.num_retimed
+
+    def edit(self, anim_curves: list[om2.MObjectHandle]) -> Optional[int]:
+        """Retime the keys of the anim curves, returning the number of keys retimed or `None`
+        when there is an error
+        """
+        # Edits work on the full key data of each curve, so every curve can be written in one go
+        curve_data, timeline = read_timeline(anim_curves)
+        if not len(timeline):
+            om2.MGlobal.displayError('No Keys Set')
+            return None
+
+        start_time, end_time = self.get_range()
+        first, last = timeline.find_strip(start_time, end_time)
+        self.retime(anim_curves, curve_data, timeline, first, last)
+        return self.num_retimed
+
+    def get_range(self) -> tuple[float, float]:
+        """Get the time range to retime. This is the time flag, the highlighted range on the time
+        slider, or the current frame when no range is highlighted.
+        """
+        if self.time_range is not None:
+            return tuple(self.time_range)
+        time_range = util.get_time_slider_range()
+        if time_range is None:
+            return self.orig_playhead_time, self.orig_playhead_time + 1
+        return time_range
+
+    def retime(
+        self,
+        anim_curves: list[om2.MObjectHandle],
+        curve_data: list[curveSnapshot.CurveData],
+        timeline: keyTimeline.KeyTimeline,
+        first: int,
+        last: int,
+    ):
+        """Retime the keys between the `first` and `last` union keys on every curve and shift
+        the keys after them. The playhead is moved to the first key of the strip (or the last one
+        when `nextKeyOnComplete` is set).
+        """
+        if first >= last:
+            return
+
+        new_union = timeline.retime(first, last, self.timing_delta, self.relative_mode)
+        self.write_times(anim_curves, curve_data, timeline, new_union)
+
+        in_strip = (timeline.union_indices > first) & (timeline.union_indices <= last)
+        self.num_retimed = int(np.count_nonzero(in_strip))
+
+        self.new_playhead_time = float(timeline.union[first])
+        if self.next_key_on_complete:
+            self.new_playhead_time = float(new_union[last])
+        set_current_time(self.new_playhead_time)
+        self.add_change(PlayheadChange(self.orig_playhead_time, self.new_playhead_time))
+
+        self.commit()
+
+    def write_times(
+        self,
+        anim_curves: list[om2.MObjectHandle],
+        curve_data: list[curveSnapshot.CurveData],
+        timeline: keyTimeline.KeyTimeline,
+        new_union: np.ndarray,
+    ):
+        """Move the keys of every curve to new union times. Each curve with keys that move is
+        rewritten in one go, with its values, tangents and flags as they were.
+        """
+        new_times = timeline.map_times(new_union)
+        to_ticks = 1.0 / curveSnapshot.get_ui_time_scale()
+        for curve_index, (anim_curve, data) in enumerate(zip(anim_curves, curve_data)):
+            keys = timeline.get_curve_slice(curve_index)
+            offsets = new_times[keys] - timeline.times[keys]
+            if not offsets.any():
+                continue
+            new_data = data._replace(times=data.times + offsets * to_ticks)
+            self.write_curve(anim_curve, new_data, before=data)
+
+    def get_strip(self, timeline: keyTimeline.KeyTimeline) -> RetimingStrip:
+        """Get the retiming strip around the current frame, e.g. `12 on 4` for the key at 12 held
+        for 4 frames. `None on 4` is used before the first key, counting from the start of the
+        animation, and `12 on End` after the last key.
+        """
+        current_time = self.orig_playhead_time
+        first, last = timeline.find_strip(current_time, current_time + 1)
+        first_frame = float(timeline.union[first])
+        last_frame = float(timeline.union[last])
+
+        key = first_frame
+        if first == last and current_time < first_frame:
+            key = None
+
+        if first == last and current_time >= last_frame:
+            timing = None
+        elif first == last:
+            timing = first_frame - get_animation_start_time()
+        else:
+            timing = last_frame - first_frame
+
+        key_text = 'None' if key is None else format_frame(key)
+        timing_text = 'End' if timing is None else format_frame(timing)
+        return RetimingStrip(key, timing, f'{key_text} on {timing_text}')
+
+
+# -------------------------------------------------------------------------------------------------
+
+
+def read_timeline(
+    anim_curves: list[om2.MObjectHandle],
+) -> tuple[list[curveSnapshot.CurveData], keyTimeline.KeyTimeline]:
+    """Read the full key data of the anim curves along with their key timeline"""
+    curve_data = [curveSnapshot.read_curve(oma2.MFnAnimCurve(c.object())) for c in anim_curves]
+    to_ui = curveSnapshot.get_ui_time_scale()
+    return curve_data, keyTimeline.KeyTimeline([data.times * to_ui for data in curve_data])
+
+
+def format_frame(frame: float) -> str:
+    """Format a frame number without a decimal part when it is a whole frame"""
+    return f'{frame:g}'
+
+
+def get_animation_start_time() -> float:
+    return oma2.MAnimControl.animationStartTime().asUnits(om2.MTime.uiUnit())
+
+
+def set_current_time(time: float):
+    oma2.MAnimControl.setCurrentTime(om2.MTime(time, om2.MTime.uiUnit()))
@@ -1,5 +1,16 @@
+from typing import NamedTuple, Optional
+
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+import numpy as np
 from maya import cmds
 
+from . import attributeTable, keyFlags, util
+from .undoableCommand import UndoableCommand
+
+# Driven keys have no time input, attributes animated by them can't be keyed
+VALID_ANIMCURVES = ['animCurveTA', 'animCurveTL', 'animCurveTT', 'animCurveTU']
+
 
 def tdtSetKeyframe(edit=False, ignoreUnkeyed=False, tickDrawSpecial=False, **kwargs):
     """Set new keys or edit the value of keys
@@ -14,25 +25,169 @@ def tdtSetKeyframe(edit=False, ignoreUnkeyed=False, tickDrawSpecial=False, **kwa
         tickDrawSpecial|tds (bool, optional):
             Use the special drawing state for the keys. Defaults to `False`.
 
+    Returns:
+        int: The number of keys at the current time.
+
     """
-    SetKeyCommand(
+    return SetKeyCommand(
         edit=kwargs.get('e', edit),
         ignoreUnkeyed=kwargs.get('iuk', ignoreUnkeyed),
         tickDrawSpecial=kwargs.get('tds', tickDrawSpecial),
     ).run()
 
 
-class SetKeyCommand:
+class KeyTarget(NamedTuple):
+    """A keyable attribute and the anim curve animating it (`None` when it isn't animated)"""
+
+    plug: om2.MPlug
+    anim_curve: Optional[om2.MObjectHandle]
+    stepped: bool
+
+
+class SetKeyCommand(UndoableCommand):
     def __init__(self, edit=False, ignoreUnkeyed=False, tickDrawSpecial=False):
+        super().__init__()
+
         self.edit_mode = edit
         self.ignore_unkeyed = ignoreUnkeyed
         self.tick_draw_special = tickDrawSpecial
 
         self.orig_playhead_time = cmds.currentTime(query=True)
         self.num_tick_draw_special = 0
+        self.num_layered_skipped = 0
 
-        # TODO ?
+        self.selected = util.get_selected_nodes()
 
     def run(self):
-        # TODO
-        raise NotImplementedError
+        if not self.selected:
+            om2.MGlobal.displayError('No Objects Selected')
+            return None
+
+        # Edit mode only updates keys that are already set
+        targets = self.find_targets(keyed_only=self.edit_mode or self.ignore_unkeyed)
+        if self.num_layered_skipped:
+            cmds.warning(
+                f'Skipped {self.num_layered_skipped} attributes animated on anim layers '
+                '(See Script Editor)'
+            )
+
+        if self.edit_mode:
+            anim_curves, indices = self.find_keys(targets)
+            # Nothing is changed, so nothing goes on the undo queue
+            if not np.any(indices >= 0):
+                om2.MGlobal.displayError('No keys set at the current time')
+                return None
+        else:
+            anim_curves, indices = self.set_keys(targets)
+
+        self.mark_keys(anim_curves, indices)
+        self.commit()
+
+        if self.num_tick_draw_special == 0:
+            om2.MGlobal.displayError('No keys set at the current time')
+            return None
+        om2.MGlobal.displayInfo(f'Result: {self.num_tick_draw_special}')
+        return self.num_tick_draw_special
+
+    def find_targets(self, keyed_only: bool = False) -> list[KeyTarget]:
+        """Find the attributes to key: the keyable, unlocked attributes of the selected nodes that
+        aren't driven by anything but an anim curve. With `keyed_only`, only attributes that are
+        already animated are used. Attributes animated on anim layers can't be keyed and are
+        reported as skipped.
+        """
+        cache = attributeTable.get_cache()
+        targets = []
+        visited = set()
+        for node in self.selected:
+            if not node.isValid():
+                continue
+            table = cache.get_table(node.object())
+            animated = np.isin(table.curve_types, VALID_ANIMCURVES)
+            valid = ~table.locked & ~table.driven & (animated | ~table.has_curve)
+            if keyed_only:
+                valid &= animated
+            for i in np.flatnonzero(~table.locked & table.layered).tolist():
+                name = table.plugs[i].partialName(includeNodeName=True)
+                om2.MGlobal.displayInfo(f'Skipping Attribute: {name} (Animated on anim layers)')
+                self.num_layered_skipped += 1
+            for i in np.flatnonzero(valid).tolist():
+                plug = table.plugs[i]
+                anim_curve = table.curves[i]
+                key = plug.name() if anim_curve is None else anim_curve.hashCode()
+                if key in visited:
+                    continue
+                visited.add(key)
+                targets.append(KeyTarget(plug, anim_curve, bool(table.stepped[i])))
+        return targets
+
+    def find_keys(
+        self, targets: list[KeyTarget]
+    ) -> tuple[list[om2.MObjectHandle], np.ndarray]:
+        """Find the key at the current time on the curve of every target"""
+        anim_curves = [t.anim_curve for t in targets]
+        return anim_curves, keyFlags.find_keys(anim_curves, self.orig_playhead_time)
+
+    def set_keys(
+        self, targets: list[KeyTarget]
+    ) -> tuple[list[om2.MObjectHandle], np.ndarray]:
+        """Key the current value of every target, returning the curves and the index of the key
+        at the current time on each. Curves are created for the attributes that aren't animated,
+        all in one DG modifier, and every key is set through one anim curve change.
+        """
+        # Read the values before new curves are connected to the attributes
+        values = [get_key_value(t.plug) for t in targets]
+        unkeyed = [i for i, t in enumerate(targets) if t.anim_curve is None]
+        anim_curves = [t.anim_curve for t in targets]
+        if unkeyed:
+            modifier = om2.MDGModifier()
+            for i in unkeyed:
+                anim_curve = oma2.MFnAnimCurve().create(targets[i].plug, modifier=modifier)
+                anim_curves[i] = om2.MObjectHandle(anim_curve)
+            self.run_modifier(modifier)
+
+        time = om2.MTime(self.orig_playhead_time, om2.MTime.uiUnit())
+        anim_change = oma2.MAnimCurveChange()
+        indices = np.zeros(len(targets), dtype=int)
+        for i, (target, anim_curve, value) in enumerate(zip(targets, anim_curves, values)):
+            fn = oma2.MFnAnimCurve(anim_curve.object())
+            index = fn.find(time) if target.anim_curve is not None else None
+            if index is not None:
+                fn.setValue(index, value, change=anim_change)
+            else:
+                out_tangent = oma2.MFnAnimCurve.kTangentGlobal
+                if target.stepped:
+                    out_tangent = oma2.MFnAnimCurve.kTangentStep
+                index = fn.addKey(
+                    time,
+                    value,
+                    tangentInType=oma2.MFnAnimCurve.kTangentGlobal,
+                    tangentOutType=out_tangent,
+                    change=anim_change,
+                )
+            indices[i] = index
+        self.add_change(anim_change)
+        return anim_curves, indices
+
+    def mark_keys(self, anim_curves: list[om2.MObjectHandle], indices: np.ndarray):
+        """Set the tick draw special state of the keys at the current time. Keys that were set
+        are plain keys, even where they replace a breakdown.
+        """
+        flags = {keyFlags.TICK_DRAW_SPECIAL: self.tick_draw_special}
+        if not self.edit_mode:
+            flags[keyFlags.BREAKDOWN] = False
+        change = keyFlags.set_flags(anim_curves, indices, flags)
+        self.add_change(change)
+        self.num_tick_draw_special = len(change)
+
+
+def get_key_value(plug: om2.MPlug) -> float:
+    """Read the value of an attribute as its anim curve keys it, in internal units. Time
+    attributes are keyed on `animCurveTT` curves, in seconds.
+    """
+    attribute = plug.attribute()
+    if (
+        attribute.hasFn(om2.MFn.kUnitAttribute)
+        and om2.MFnUnitAttribute(attribute).unitType() == om2.MFnUnitAttribute.kTime
+    ):
+        return plug.asMTime().asUnits(om2.MTime.kSeconds)
+    return plug.asDouble()
@@ -0,0 +1,79 @@
+"""Undo support for changes made through the Maya API
+
+Edits made with API function sets (MFnAnimCurve, ...) are not recorded by Maya's undo queue. Once
+they have been applied, the objects holding the changes (e.g. `oma2.MAnimCurveChange`, or anything
+else with `undoIt` and `redoIt` methods) are handed to `commit`, which runs the `tdtUndo` plugin
+command so the changes become a single entry on the undo queue.
+"""
+import os
+import sys
+import types
+
+import maya.api.OpenMaya as om2
+from maya import cmds
+
+PLUGIN_NAME = os.path.splitext(os.path.basename(__file__))[0]
+COMMAND_NAME = 'tdtUndo'
+
+# Maya loads a plugin file as its own module, separate from the one imported through this package,
+# so the changes waiting to be picked up by the command are kept on a module both copies can see
+_shared = sys.modules.setdefault('_tdtUndoShared', types.ModuleType('_tdtUndoShared'))
+if not hasattr(_shared, 'pending'):
+    _shared.pending = []
+
+
+def maya_useNewAPI():
+    """Tell Maya this plugin uses the Python API 2.0"""
+
+
+def commit(*changes):
+    """Add the already applied changes to Maya's undo queue as a single undo entry"""
+    changes = [c for c in changes if c is not None]
+    if not changes:
+        return
+
+    if not cmds.pluginInfo(PLUGIN_NAME, query=True, loaded=True):
+        cmds.loadPlugin(__file__, quiet=True)
+
+    _shared.pending.extend(changes)
+    try:
+        getattr(cmds, COMMAND_NAME)()
+    finally:
+        _shared.pending.clear()
+
+
+class UndoCommand(om2.MPxCommand):
+    """Keeps API changes on the undo queue. The changes are applied before the command is run."""
+
+    def __init__(self):
+        super().__init__()
+        self.changes = []
+
+    @staticmethod
+    def creator():
+        return UndoCommand()
+
+    def doIt(self, args):
+        self.changes = list(_shared.pending)
+        _shared.pending.clear()
+
+    def redoIt(self):
+        for change in self.changes:
+            change.redoIt()
+
+    def undoIt(self):
+        for change in reversed(self.changes):
+            change.undoIt()
+
+    def isUndoable(self):
+        return True
+
+
+def initializePlugin(plugin):
+    om2.MFnPlugin(plugin, 'Circus Ink Entertainment Ltd.').registerCommand(
+        COMMAND_NAME, UndoCommand.creator
+    )
+
+
+def uninitializePlugin(plugin):
+    om2.MFnPlugin(plugin).deregisterCommand(COMMAND_NAME)
@@ -0,0 +1,123 @@
+"""Base for commands that edit anim curves through the Maya API
+
+Before a command first edits a curve it records the curve's keys. Once the command is done the
+keys are read again and both copies are put on the undo queue as a single `tdtUndo` entry, so undo
+and redo rewrite each curve from its arrays however many edits the command made.
+"""
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+
+from . import cleanCache, curveSnapshot, keyTimelineCache, undoCommand
+
+
+class CurveChange:
+    """The keys of an anim curve before and after a command, or only the keys from index `start`
+    on when the keys before them weren't changed
+    """
+
+    def __init__(
+        self, anim_curve: om2.MObjectHandle, before: curveSnapshot.CurveData, start: int = 0
+    ):
+        self.anim_curve = anim_curve
+        self.before = before
+        self.after = None
+        self.start = start
+
+    def undoIt(self):
+        self.write(self.before)
+
+    def redoIt(self):
+        self.write(self.after)
+
+    def write(self, data: curveSnapshot.CurveData):
+        if data is not None and self.anim_curve.isValid():
+            anim_curve_fn = oma2.MFnAnimCurve(self.anim_curve.object())
+            curveSnapshot.write_curve(anim_curve_fn, data, self.start)
+            # The curve no longer has the keys of its last clean
+            cleanCache.discard(self.anim_curve)
+            keyTimelineCache.invalidate()
+
+
+class ModifierChange:
+    """A DG modifier that has already been run"""
+
+    def __init__(self, modifier: om2.MDGModifier):
+        self.modifier = modifier
+
+    def undoIt(self):
+        self.modifier.undoIt()
+
+    def redoIt(self):
+        self.modifier.doIt()
+
+
+class UndoableCommand:
+    def __init__(self):
+        self.changes = []
+        self.curve_changes = {}
+
+    def record(
+        self, anim_curve: om2.MObjectHandle, before: curveSnapshot.CurveData = None
+    ) -> CurveChange:
+        """Record the keys of an anim curve before it is edited. Only the first call for each curve
+        records anything. `before` can be given when the keys have just been read.
+        """
+        key = anim_curve.hashCode()
+        change = self.curve_changes.get(key)
+        if change is None:
+            if before is None:
+                before = curveSnapshot.read_curve(oma2.MFnAnimCurve(anim_curve.object()))
+            change = self.curve_changes[key] = CurveChange(anim_curve, before)
+            self.changes.append(change)
+        # The keys are read again once the command is done
+        change.after = None
+        return change
+
+    def write_curve(
+        self,
+        anim_curve: om2.MObjectHandle,
+        data: curveSnapshot.CurveData,
+        before: curveSnapshot.CurveData = None,
+    ):
+        """Replace all the keys of an anim curve in one go. As the new keys are known, they don't
+        need reading again.
+        """
+        change = self.record(anim_curve, before)
+        curveSnapshot.write_curve(oma2.MFnAnimCurve(anim_curve.object()), data)
+        change.after = data
+
+    def shift_keys(self, anim_curve: om2.MObjectHandle, start: int, offset: float):
+        """Move the keys of an anim curve from index `start` on by `offset` ticks. The keys are
+        read once, written back at their new times in one go and only they go on the undo queue.
+        The keys must not pass the keys before `start`.
+        """
+        anim_curve_fn = oma2.MFnAnimCurve(anim_curve.object())
+        change = CurveChange(anim_curve, curveSnapshot.read_curve(anim_curve_fn, start), start)
+        change.after = change.before._replace(times=change.before.times + offset)
+        curveSnapshot.write_curve(anim_curve_fn, change.after, start)
+        self.add_change(change)
+
+    def run_modifier(self, modifier: om2.MDGModifier):
+        """Run a DG modifier (creating, deleting or connecting nodes) as part of the command"""
+        modifier.doIt()
+        self.add_change(ModifierChange(modifier))
+
+    def add_change(self, change):
+        """Add any other change that has been made, with `undoIt` and `redoIt` methods"""
+        self.changes.append(change)
+
+    def commit(self) -> list[CurveChange]:
+        """Record the keys of the edited curves again and add the changes to the undo queue. The
+        committed curve changes are returned.
+        """
+        curve_changes = list(self.curve_changes.values())
+        for change in curve_changes:
+            if change.after is None and change.anim_curve.isValid():
+                change.after = curveSnapshot.read_curve(
+                    oma2.MFnAnimCurve(change.anim_curve.object())
+                )
+        undoCommand.commit(*self.changes)
+        keyTimelineCache.invalidate()
+        self.changes = []
+        self.curve_changes = {}
+        return curve_changes
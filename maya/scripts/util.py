@@ -1,6 +1,10 @@
 from contextlib import contextmanager
+from typing import Optional
 
-from maya import cmds
+import maya.api.OpenMaya as om2
+from maya import cmds, mel
+
+from . import animCurveIndex, characterSetCache
 
 
 def get_selected_objects() -> list[str]:
@@ -11,25 +15,75 @@ def get_selected_objects() -> list[str]:
        2) Character Sets selected by the user (and their subsets)
        3) Objects selected by the user
 
+    Names are only resolved for the result, use `get_selected_nodes` to work on the nodes.
     """
-    selected = []
+    return [get_name(handle.object()) for handle in get_selected_nodes()]
+
+
+def get_selected_nodes() -> list[om2.MObjectHandle]:
+    """Get the handles of all the selected objects (see `get_selected_objects`)"""
+    # Get the character set if active (in Maya). Character sets selected by the user come with the
+    # rest of the selection
+    active_list = om2.MSelectionList()
+    for node in get_highlighted_nodes():
+        active_list.add(node)
+    active = get_nodes(active_list)
+    selected = get_nodes(om2.MGlobal.getActiveSelectionList())
+
+    # Add the subsets of the active and selected character sets, then the selected objects
+    cache = characterSetCache.get_cache()
+    handles = cache.expand_nodes(active) + cache.expand_nodes(selected)
+    handles.extend(om2.MObjectHandle(n) for n in selected)
+    return unique_handles(handles)
 
-    # Get the character set if active (in Maya) and the associated character set subsets
-    selected.extend(get_active_character_sets())
 
-    # Get the character sets selected (by user) and the associated character set subsets
-    selected.extend(get_selected_character_sets())
+def get_highlighted_nodes() -> list[str]:
+    """Get the nodes in the highlight list, which holds the active character set"""
+    # There is no highlight list without the interface
+    if om2.MGlobal.mayaState() != om2.MGlobal.kInteractive:
+        return []
+    return cmds.selectionConnection('highlightList', query=True, object=True) or []
 
-    # Get the currently selected objects
-    selected.extend(cmds.ls(selection=True, objectsOnly=True))
 
-    return list(set(selected))
+def get_nodes(selection_list: om2.MSelectionList) -> list[om2.MObject]:
+    """Get the node of each item in a selection list. Components give the node they belong to."""
+    return [selection_list.getDependNode(i) for i in range(selection_list.length())]
+
+
+def unique_handles(handles: list[om2.MObjectHandle]) -> list[om2.MObjectHandle]:
+    """Remove the repeated nodes from a list of handles, keeping the first of each"""
+    results = []
+    visited = set()
+    for handle in handles:
+        key = handle.hashCode()
+        if key not in visited:
+            visited.add(key)
+            results.append(handle)
+    return results
+
+
+def get_anim_curves(
+    nodes: list[om2.MObjectHandle], curve_types: list[str] = None, layered: bool = True
+) -> list[om2.MObjectHandle]:
+    """Get the anim curves animating the keyable attributes of a list of nodes. Curves on anim
+    layers are left out when `layered` is `False`.
+    """
+    grouped = animCurveIndex.get_index().get_curves(
+        [n.object() for n in nodes if n.isValid()], curve_types=curve_types, layered=layered
+    )
+    return [curve for curves in grouped.values() for curve in curves]
+
+
+def get_name(node: om2.MObject) -> str:
+    """Get the name of a node for messages. DAG nodes use their shortest unique path."""
+    if node.hasFn(om2.MFn.kDagNode):
+        return om2.MDagPath.getAPathTo(node).partialPathName()
+    return om2.MFnDependencyNode(node).name()
 
 
 def get_active_character_sets() -> list[str]:
     """Create a list of the currently active character set and its subsets"""
-    nodes = cmds.selectionConnection('highlightList', query=True, object=True) or []
-    return epxand_character_subsets(nodes)
+    return epxand_character_subsets(get_highlighted_nodes())
 
 
 def get_selected_character_sets() -> list[str]:
@@ -38,18 +92,25 @@ def get_selected_character_sets() -> list[str]:
 
 
 def get_sub_character_sets(character_set: str) -> list[str]:
-    """Recursively create a list of sub character sets"""
-    nodes = set(cmds.character(character_set, query=True, nodesOnly=True))
-    return epxand_character_subsets(nodes)
+    """Create a list of sub character sets (and their subsets)"""
+    return characterSetCache.get_cache().expand([character_set])[1:]
 
 
 def epxand_character_subsets(nodes):
-    results = []
-    char_sets = [n for n in nodes if cmds.objectType(n, isType='character')]
-    for char_set in char_sets:
-        results.append(char_set)
-        results.extend(get_sub_character_sets(char_set))
-    return results
+    """Create a list of the character sets in the given nodes and their subsets"""
+    return characterSetCache.get_cache().expand(nodes)
+
+
+def get_time_slider_range() -> Optional[tuple[float, float]]:
+    """Get the highlighted range of the time slider, or `None` when no range is highlighted"""
+    # There is no time slider without the interface
+    if om2.MGlobal.mayaState() != om2.MGlobal.kInteractive:
+        return None
+    time_slider = mel.eval('$tmpVar = $gPlayBackSlider')
+    if not time_slider or not cmds.timeControl(time_slider, query=True, rangeVisible=True):
+        return None
+    start, end = cmds.timeControl(time_slider, query=True, rangeArray=True)
+    return start, end
 
 
 @contextmanager
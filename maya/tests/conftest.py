@@ -0,0 +1,11 @@
+"""The array modules of `scripts` (curveAnalysis, keyTimeline, breakdown) don't talk to Maya, so
+their tests import them straight from the scripts folder and run with plain Python. Tests of the
+commands import the `scripts` package and are skipped without `mayapy`.
+"""
+import os
+import sys
+
+MAYA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(MAYA_DIR, 'scripts'))
+sys.path.insert(1, MAYA_DIR)
@@ -0,0 +1,81 @@
+import json
+from concurrent.futures import Executor, Future
+
+import pytest
+
+standalone = pytest.importorskip('maya.standalone')
+
+
+class InlineExecutor(Executor):
+    """Runs every job on the calling thread, as Maya commands only run on the main thread"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+@pytest.fixture(scope='module')
+def maya_session():
+    standalone.initialize(name='python')
+    yield
+    standalone.uninitialize()
+
+
+@pytest.fixture
+def scene_file(maya_session, tmp_path):
+    from maya import cmds
+
+    cmds.file(new=True, force=True)
+    cube = cmds.polyCube()[0]
+    for frame, value in ((1, 0.0), (5, 0.0), (10, 0.0), (15, 3.0)):
+        cmds.setKeyframe(cube, attribute='translateX', time=frame, value=value)
+    path = tmp_path / 'shot.ma'
+    cmds.file(rename=str(path))
+    cmds.file(save=True, type='mayaAscii')
+    cmds.file(new=True, force=True)
+    return path
+
+
+def test_run_batch_in_process(scene_file, tmp_path):
+    from scripts import batch
+
+    # A name already taken is skipped, never overwritten
+    taken = tmp_path / 'shot.000.ma'
+    taken.write_text('')
+    log_path = tmp_path / 'batch.json'
+    operations = [{'command': 'tdtCleanCurves', 'flags': {'rrk': True}}]
+
+    results = batch.run_batch(
+        [str(scene_file)],
+        operations,
+        log_path=str(log_path),
+        runner=batch.run_job,
+        executor=InlineExecutor(),
+    )
+
+    assert [r['status'] for r in results] == ['ok'], results
+    assert results[0]['saved'] == str(tmp_path / 'shot.001.ma')
+    assert (tmp_path / 'shot.001.ma').exists()
+    assert taken.read_text() == ''
+
+    log = json.loads(log_path.read_text())
+    assert log['finished']
+    assert [f['status'] for f in log['files']] == ['ok']
+
+
+def test_run_batch_unknown_command(scene_file):
+    from scripts import batch
+
+    results = batch.run_batch(
+        [str(scene_file)],
+        [{'command': 'tdtShotMask'}],
+        runner=batch.run_job,
+        executor=InlineExecutor(),
+    )
+
+    assert results[0]['status'] == 'failed'
+    assert "can't be run in a batch" in results[0]['error']
@@ -0,0 +1,268 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import curveAnalysis
+from curveAnalysis import CleanSettings, CurveKeys
+
+
+def loop_peaks_and_valleys(values):
+    """The key by key peak/valley loop the curve cleaner used before it was vectorized. A plateau
+    that runs to the last key is compared against its own value.
+    """
+    num_keys = len(values)
+    peak_or_valley = [False] * num_keys
+    if num_keys:
+        prev_inequal_value = values[0]
+    for i in range(1, num_keys - 1):
+        prev_val, curr_val, next_val = values[i - 1 : i + 2]
+        if curr_val != prev_val:
+            prev_inequal_value = prev_val
+        if curr_val != next_val:
+            next_inequal_val = next_val
+        else:
+            next_inequal_val = curr_val
+            for j in range(i + 2, num_keys):
+                next_inequal_val = values[j]
+                if next_inequal_val != curr_val:
+                    break
+        if (curr_val <= prev_inequal_value and curr_val <= next_inequal_val) or (
+            curr_val >= prev_inequal_value and curr_val >= next_inequal_val
+        ):
+            peak_or_valley[i] = True
+    return peak_or_valley
+
+
+def loop_tangents(times, values, smoothing_value, weight_factor, smooth_all_splines):
+    """The key by key tangent loop of the curve cleaner. Returns the angle and weight of every
+    smoothed key by index.
+    """
+    peak_or_valley = loop_peaks_and_valleys(values)
+    tangents = {}
+    for i in range(1, len(times) - 1):
+        if peak_or_valley[i]:
+            continue
+        if not (smooth_all_splines or peak_or_valley[i - 1] or peak_or_valley[i + 1]):
+            continue
+        angle_in = math.atan((values[i] - values[i - 1]) / (times[i] - times[i - 1]))
+        angle_out = math.atan((values[i + 1] - values[i]) / (times[i + 1] - times[i]))
+        angle = angle_in if abs(angle_out) > abs(angle_in) else angle_out
+        softness = abs(angle_out - angle_in) * smoothing_value
+        if angle_in > 0 or (angle_in == 0 and angle_out > 0):
+            angle += softness
+        else:
+            angle -= softness
+        weight = (times[i] - times[i - 1]) / math.cos(angle) * weight_factor
+        tangents[i] = (angle, weight)
+    return tangents
+
+
+@pytest.mark.parametrize(
+    'values',
+    [
+        [],
+        [1.0],
+        [1.0, 2.0],
+        [2.0, 2.0],
+        [0.0, 1.0, 0.0],
+        [0.0, 1.0, 2.0],
+        [1.0, 1.0, 1.0],
+        [0.0, 1.0, 1.0],
+        [0.0, 0.0, 1.0],
+        [0.0, 2.0, 2.0, 2.0, 1.0],
+        [0.0, 2.0, 2.0, 2.0, 3.0],
+        [3.0, 3.0, 1.0, 1.0, 2.0, 2.0],
+    ],
+)
+def test_peaks_and_valleys_match_loop(values):
+    expected = loop_peaks_and_valleys(values)
+    assert curveAnalysis.get_peaks_and_valleys(values).tolist() == expected
+
+
+def test_peaks_and_valleys_match_loop_on_plateaus():
+    rng = np.random.default_rng(7)
+    for _ in range(500):
+        # Few distinct values so most curves have plateaus
+        values = rng.integers(0, 3, rng.integers(0, 12)).astype(float).tolist()
+        expected = loop_peaks_and_valleys(values)
+        assert curveAnalysis.get_peaks_and_valleys(values).tolist() == expected, values
+
+
+@pytest.mark.parametrize('smooth_all_splines', [False, True])
+@pytest.mark.parametrize('smoothing_value', [0.0, 0.4])
+def test_solve_tangents_match_loop(smoothing_value, smooth_all_splines):
+    rng = np.random.default_rng(3)
+    times = np.cumsum(rng.integers(1, 4, 40)).astype(float)
+    values = rng.integers(-3, 4, 40).astype(float)
+
+    solution = curveAnalysis.solve_tangents(
+        times, values, smoothing_value, 0.333, smooth_all_splines
+    )
+    expected = loop_tangents(times, values, smoothing_value, 0.333, smooth_all_splines)
+
+    assert solution.peak_or_valley.tolist() == loop_peaks_and_valleys(values.tolist())
+    assert np.flatnonzero(solution.smoothed).tolist() == sorted(expected)
+    indices = sorted(expected)
+    np.testing.assert_allclose(
+        solution.tangent_angles[indices], [expected[i][0] for i in indices]
+    )
+    np.testing.assert_allclose(
+        solution.tangent_weights[indices], [expected[i][1] for i in indices]
+    )
+    assert not solution.tangent_angles[~solution.smoothed].any()
+    assert not solution.tangent_weights[~solution.smoothed].any()
+
+
+@pytest.mark.parametrize('num_keys', [0, 1, 2])
+def test_solve_tangents_short_curves(num_keys):
+    solution = curveAnalysis.solve_tangents(np.arange(num_keys), np.arange(num_keys))
+    assert len(solution.smoothed) == num_keys
+    assert not solution.smoothed.any()
+    assert not solution.peak_or_valley.any()
+
+
+def test_find_static_curves():
+    curves = [[], [1.0], [1.0, 1.0, 1.0], [1.0, 1.005, 0.998], [0.0, 1.0], [2.0, 2.0, 2.5]]
+    assert curveAnalysis.find_static_curves(curves).tolist() == [
+        False, True, True, False, False, False
+    ]
+    assert curveAnalysis.find_static_curves(curves, tolerance=0.01).tolist() == [
+        False, True, True, True, False, False
+    ]
+    assert curveAnalysis.find_static_curves([]).tolist() == []
+    assert curveAnalysis.find_static_curves([[], []]).tolist() == [False, False]
+
+
+def test_plan_clean_removes_redundant_keys():
+    keys = CurveKeys(np.arange(7.0), np.array([0.0, 0.0, 0.0, 1.0, 1.0, 1.0, 0.0]))
+    plan = curveAnalysis.plan_clean(keys, CleanSettings(remove_redundant_keys=True))
+    assert plan.redundant.tolist() == [1, 4]
+    assert plan.reduced.tolist() == []
+    assert len(plan.tangents.smoothed) == 5
+    assert plan.edited.all()
+
+
+def test_plan_clean_partial_range():
+    values = np.array([0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0, 1.0, 2.0, 2.0, 2.0])
+    keys = CurveKeys(np.arange(len(values), dtype=float), values, edit_start=2, edit_stop=6)
+    plan = curveAnalysis.plan_clean(keys, CleanSettings(remove_redundant_keys=True))
+
+    # Only the keys in the editable range are removed or edited
+    assert plan.redundant.tolist() == [2, 5]
+    keep = np.ones(len(values), dtype=bool)
+    keep[plan.redundant] = False
+    assert plan.edited.tolist() == keys.get_editable()[keep].tolist()
+
+
+def test_plan_clean_partial_range_reduce():
+    times = np.arange(200, dtype=float)
+    values = np.sin(times / 20)
+    keys = CurveKeys(times, values, edit_start=50, edit_stop=150)
+    plan = curveAnalysis.plan_clean(keys, CleanSettings(reduce_keys=True, tolerance=0.01))
+
+    assert len(plan.reduced)
+    assert plan.reduced.min() >= 50
+    assert plan.reduced.max() < 150
+
+
+def test_plan_clean_without_tangents():
+    keys = CurveKeys(np.arange(3.0), np.zeros(3))
+    plan = curveAnalysis.plan_clean(keys, CleanSettings(clean_tangents=False))
+    assert plan.tangents is None
+    assert plan.edited is None
+
+
+def assert_plans_equal(plans, expected):
+    assert len(plans) == len(expected)
+    for plan, other in zip(plans, expected):
+        assert plan.redundant.tolist() == other.redundant.tolist()
+        assert plan.reduced.tolist() == other.reduced.tolist()
+        assert plan.edited.tolist() == other.edited.tolist()
+        for array, other_array in zip(plan.tangents, other.tangents):
+            np.testing.assert_array_equal(array, other_array)
+
+
+def make_curves(num_curves):
+    rng = np.random.default_rng(11)
+    curves = []
+    for i in range(num_curves):
+        times = np.arange(30, dtype=float)
+        values = np.round(np.sin(times / (3 + i % 5)) * 4 + rng.normal(0, 0.1, 30))
+        curves.append(CurveKeys(times, values, edit_start=i % 10, edit_stop=30 - i % 7))
+    return curves
+
+
+def test_plan_clean_curves_threaded():
+    curves = make_curves(curveAnalysis.PARALLEL_MIN_CURVES + 16)
+    settings = CleanSettings(remove_redundant_keys=True, reduce_keys=True, smoothing_value=0.2)
+    expected = [curveAnalysis.plan_clean(keys, settings) for keys in curves]
+
+    assert_plans_equal(curveAnalysis.plan_clean_curves(curves, settings), expected)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert_plans_equal(curveAnalysis.plan_clean_curves(curves, settings, executor), expected)
+
+
+def test_plan_clean_curves_few_curves():
+    curves = make_curves(3)
+    settings = CleanSettings(remove_redundant_keys=True)
+    expected = [curveAnalysis.plan_clean(keys, settings) for keys in curves]
+    assert_plans_equal(curveAnalysis.plan_clean_curves(curves, settings), expected)
+    assert curveAnalysis.plan_clean_curves([], settings) == []
+
+
+@pytest.mark.parametrize('num_keys', [0, 1, 2])
+def test_reduce_keys_short_curves(num_keys):
+    keep = curveAnalysis.reduce_keys(np.arange(num_keys), np.arange(num_keys), 0.01)
+    assert keep.tolist() == [True] * num_keys
+
+
+@pytest.mark.parametrize(
+    'values, expected',
+    [
+        ([0.0, 1.0, 2.0], [True, False, True]),
+        ([0.0, 0.0, 0.0], [True, False, True]),
+        ([0.0, 1.0, 0.0], [True, True, True]),
+        ([0.0, 0.005, 0.0], [True, False, True]),
+    ],
+)
+def test_reduce_keys_three_keys(values, expected):
+    assert curveAnalysis.reduce_keys(np.arange(3.0), values, 0.01).tolist() == expected
+
+
+def make_reduce_curves():
+    rng = np.random.default_rng(5)
+    times = np.arange(2000, dtype=float)
+    return {
+        'sine': (times, np.sin(times / 50) * 10),
+        'stairs': (times, np.floor(times / 10)),
+        'noise': (times, np.sin(times / 20) * 10 + rng.normal(0, 0.05, len(times))),
+        'uneven': (np.cumsum(rng.uniform(0.5, 3.0, 500)), rng.normal(0, 1, 500).cumsum()),
+    }
+
+
+@pytest.mark.parametrize('name', sorted(make_reduce_curves()))
+@pytest.mark.parametrize(
+    'settings',
+    [
+        {},
+        {'time_tolerance': 0.5},
+        {'smoothing_value': 0.3},
+        {'smooth_all_splines': True},
+    ],
+)
+def test_reduce_keys_within_tolerance(name, settings):
+    times, values = make_reduce_curves()[name]
+    keep = curveAnalysis.reduce_keys(times, values, 0.01, **settings)
+
+    assert keep[0] and keep[-1]
+    assert not keep.all()
+    _, errors = curveAnalysis.get_refit_errors(times, values, keep, **settings)
+    assert errors.max() <= 0.01
+
+
+def test_reduce_keys_smooth_curve():
+    times = np.arange(20000, dtype=float)
+    keep = curveAnalysis.reduce_keys(times, np.sin(times / 500) * 10, 0.01)
+    assert np.count_nonzero(keep) < 500
@@ -1,4 +1,4 @@
-# tradigiTOOLS.py — PySide2/Qt UI-only (no Maya ops)
+# tradigiTOOLS.py — PySide2/Qt UI; keyCONTROL and timeSHIFT run the commands in `scripts`
 # Tangent icons updated for your build (autoTangent, splineTangent, stepTangent, etc.)
 from __future__ import annotations
 import os
@@ -8,6 +8,12 @@ try:
     from maya.app.general.mayaMixin import MayaQWidgetDockableMixin
 except Exception:
     class MayaQWidgetDockableMixin(object): pass
+try:
+    import maya.api.OpenMaya as om2
+    from scripts import breakdownCommand, nudgeCommand, retimingCommand
+except ImportError as e:
+    cmds.warning(f"tradigiTOOLS: commands unavailable, sliders and timing buttons are disabled ({e})")
+    om2 = breakdownCommand = nudgeCommand = retimingCommand = None
 
 APP_ID = "tradigiTOOLS"
 TITLE  = "tradigiTOOLS"
@@ -45,6 +51,7 @@ MAKER_LRM     = 7
 SET_W, SET_SPACING, SET_LRM = 40, 2, 7
 NUD_W, NUD_SPACING, NUD_LRM = 35, 2, 6
 INCR_BTN, INCR_SPACING, INCR_LRM = 24, 6, 7
+TIMING_REFRESH_MS = 50  # KEY/Timing labels refresh at most this often while the time changes
 
 QS_COL_GAP, QS_LRM = 2, 7
 QS_COL_W = int((W_CONTENT - 2*QS_LRM - QS_COL_GAP) / 2)
@@ -352,6 +359,14 @@ class KeyControl(QtWidgets.QWidget):
         self.key_bias.editingFinished.connect(lambda: self.keys_slider.setValue(self._coerce(self.key_bias.text())))
         self.brk_bias.editingFinished.connect(lambda: self.brks_slider.setValue(self._coerce(self.brk_bias.text())))
 
+        # dragging a slider sets breakdowns live, one undo entry per drag
+        self._session = None
+        if breakdownCommand:
+            for s in (self.keys_slider, self.brks_slider):
+                s.sliderPressed.connect(lambda s=s: self._begin_drag(s))
+                s.valueChanged.connect(self._drag)
+                s.sliderReleased.connect(self._end_drag)
+
     def _track_banner(self, text):
         h = QtWidgets.QHBoxLayout(); h.setContentsMargins(0,0,0,0); h.setSpacing(0)
         h.addSpacing(TRACK_LEFT_PAD); h.addWidget(label(text, TRACK_W)); h.addStretch(1); return h
@@ -383,6 +398,25 @@ class KeyControl(QtWidgets.QWidget):
         bh.addSpacing(BIAS_SIDE_GAP)
         bh.addStretch(1)
         return bh
+    def _begin_drag(self, slider:QtWidgets.QSlider):
+        # ripple breakdowns shift keys, they can't follow a drag
+        if self.cb_ripple.isChecked(): return
+        # KEYs set plain keys, BRKs set breakdown keys. Skip Unkeyed skips the attributes without
+        # keys either side of the current time instead of failing
+        self._session = breakdownCommand.BreakdownCommand(
+            weight=slider.value()/100.0, selectedAttr=self.cb_selattr.isChecked(),
+            invalidAttrOpFlag="skipAttr" if self.cb_skip.isChecked() else "skipAll",
+            breakdownKey=slider is self.brks_slider)
+        if not self._session.begin(): self._session = None
+    def _drag(self, v:int):
+        if self._session: self._session.update(v/100.0)
+    def _end_drag(self):
+        if self._session: self._session.end(); self._session = None
+    # a drag cut short by hiding or closing the panel still ends on the undo queue
+    def hideEvent(self, event):
+        self._end_drag(); super().hideEvent(event)
+    def closeEvent(self, event):
+        self._end_drag(); super().closeEvent(event)
     def _set_bias(self, line:QtWidgets.QLineEdit, v:int):
         line.blockSignals(True); line.setText(str(int(v))); line.blockSignals(False)
     def _coerce(self, txt:str)->int:
@@ -401,7 +435,9 @@ class TimeShift(QtWidgets.QWidget):
         hdr.addWidget(QtWidgets.QLabel("setTIME")); hdr.addStretch(1); v.addLayout(hdr)
 
         row = QtWidgets.QHBoxLayout(); row.setContentsMargins(SET_LRM,0,SET_LRM,0); row.setSpacing(SET_SPACING)
-        for t in ("1s","2s","3s","4s","5s","6s","8s"): row.addWidget(push_btn(t, SET_W))
+        for t in ("1s","2s","3s","4s","5s","6s","8s"):
+            btn = push_btn(t, SET_W); row.addWidget(btn)
+            if retimingCommand: btn.clicked.connect(lambda *_, n=int(t[:-1]): self._set_spacing(n))
         v.addLayout(row)
 
         v.addSpacing(6)
@@ -415,7 +451,9 @@ class TimeShift(QtWidgets.QWidget):
         v.addSpacing(6)
         v.addWidget(QtWidgets.QLabel("nudgeTIME"))
         nud = QtWidgets.QHBoxLayout(); nud.setContentsMargins(NUD_LRM,0,NUD_LRM,0); nud.setSpacing(NUD_SPACING)
-        for t in ("-8","-4","-2","-1","+1","+2","+4","+8"): nud.addWidget(push_btn(t, NUD_W))
+        for t in ("-8","-4","-2","-1","+1","+2","+4","+8"):
+            btn = push_btn(t, NUD_W); nud.addWidget(btn)
+            if nudgeCommand: btn.clicked.connect(lambda *_, n=int(t): self._nudge(n))
         v.addLayout(nud)
 
         v.addSpacing(4)
@@ -445,6 +483,33 @@ class TimeShift(QtWidgets.QWidget):
 
         fw.addWidget(footer); v.addWidget(foot_wrap)
 
+        # live KEY/Timing: time changes only (re)start a timer, the query runs when it fires
+        self._timing_timer = QtCore.QTimer(self); self._timing_timer.setSingleShot(True)
+        self._timing_timer.setInterval(TIMING_REFRESH_MS); self._timing_timer.timeout.connect(self._refresh_timing)
+        if om2 and retimingCommand:
+            ids = [om2.MEventMessage.addEventCallback(e, self._on_time_changed) for e in ("timeChanged","SelectionChanged")]
+            self.destroyed.connect(lambda *_: om2.MMessage.removeCallbacks(ids))
+            self._refresh_timing()
+
+    def _set_spacing(self, frames:int):
+        retimingCommand.tdtRetiming(spacing=frames); self._refresh_timing()
+
+    def _nudge(self, frames:int):
+        nudgeCommand.tdtNudgeTime(delta=frames); self._refresh_timing()
+
+    def _on_time_changed(self, *args):
+        if not self._timing_timer.isActive(): self._timing_timer.start()
+
+    def _refresh_timing(self):
+        try: strip = retimingCommand.tdtRetiming(query=True)
+        except Exception: return
+        if strip.key is None and strip.timing is None:
+            key, timing = "-", "-"
+        else:
+            key = "None" if strip.key is None else f"{strip.key:g}"
+            timing = "End" if strip.timing is None else f"{strip.timing:g}"
+        self.lbl_key.setText(key); self.lbl_timing.setText(timing)
+
 # ---------- viewSWITCH ----------
 class ViewSwitch(QtWidgets.QWidget):
     def __init__(self):